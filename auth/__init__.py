@@ -0,0 +1,3 @@
+# authentication shared by the user and store services
+from auth.tokens import Claims, JWTAuth, TokenCache
+from auth.decorators import AuthMetrics, auth_metrics, request_claims, require_role
@@ -0,0 +1,73 @@
+import functools
+import threading
+import time
+from flask import g, jsonify, request
+
+from auth.tokens import JWTAuth
+
+
+# latency histogram of request authentication
+class AuthMetrics:
+
+    # upper bounds of the buckets in seconds
+    BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.rejected = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(self.BUCKETS) + 1)
+
+    def observe(self, seconds, rejected):
+        with self.lock:
+            self.count += 1
+            self.rejected += 1 if rejected else 0
+            self.seconds += seconds
+
+            bucket = 0
+            while bucket < len(self.BUCKETS) and seconds > self.BUCKETS[bucket]:
+                bucket += 1
+            self.buckets[bucket] += 1
+
+    # function that returns the histogram, every bucket counts the requests authenticated in at most its bound
+    def stats(self):
+        bounds = [str(bound) for bound in self.BUCKETS] + ["+Inf"]
+        with self.lock:
+            return {
+                "count": self.count,
+                "rejected": self.rejected,
+                "seconds": round(self.seconds, 6),
+                "buckets": dict(zip(bounds, self.buckets)),
+                "cache": JWTAuth.cache.stats(),
+            }
+
+
+# authentication of requests handled by this process
+auth_metrics = AuthMetrics()
+
+
+# function that returns claims of the request's bearer token, the header is parsed once per request
+def request_claims():
+    if "claims" not in g:
+        header = request.headers.get('Authorization')
+        g.claims = JWTAuth.validate_token(header.replace('Bearer ', '')) if header else None
+    return g.claims
+
+
+# decorator of endpoints that need a valid token with one of the given roles, or any role when none is given
+# claims of the token are available in g.claims
+def require_role(*roles):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            claims = request_claims()
+            allowed = claims is not None and (not roles or claims.role in roles)
+            auth_metrics.observe(time.perf_counter() - start, not allowed)
+
+            if not allowed:
+                return jsonify({'msg': "Missing Authorization Header"}), 401
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,135 @@
+import os
+import jwt
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+# claims of a verified access token
+class Claims:
+
+    __slots__ = ("email", "role", "forename", "surname", "expires")
+
+    def __init__(self, email: str, role: str, forename: str, surname: str, expires: int):
+        self.email = email
+        self.role = role
+        self.forename = forename
+        self.surname = surname
+        self.expires = expires
+
+    @staticmethod
+    def from_payload(payload: dict):
+        return Claims(payload['sub'], payload['roles'], payload.get('forename', ""), payload.get('surname', ""), payload['exp'])
+
+    def __repr__(self):
+        return f"<Claims(email='{self.email}', role='{self.role}', expires={self.expires})>"
+
+
+# cache of verified tokens by their digest, claims are kept until the token expires
+# when the cache is full the least recently used token is evicted
+class TokenCache:
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # token digest -> claims
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    # function that returns claims of the token if it has been verified and has not expired, otherwise None
+    def get(self, token):
+        key = TokenCache.digest(token)
+        with self.lock:
+            claims = self.entries.get(key)
+            if claims is not None and claims.expires <= time.time():
+                del self.entries[key]
+                self.expirations += 1
+                claims = None
+
+            if claims is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, token, claims):
+        key = TokenCache.digest(token)
+        with self.lock:
+            self.entries[key] = claims
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    # function that returns counters of the cache
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self.entries),
+                "max_size": self.max_size,
+            }
+
+
+class JWTAuth:
+
+    SECRET_KEY = os.getenv("JWT", "")
+    ALGORITHM = 'HS256'
+    EXPIRATION = 60
+
+    # tokens verified by this process
+    cache = TokenCache(int(os.getenv("JWT_CACHE_SIZE", 10000)))
+
+    @staticmethod
+    def generate_token(data):
+        payload = {}
+
+        now = datetime.datetime.now(datetime.UTC)
+        payload['sub'] = data['email']
+        payload['forename'] = data['forename']
+        payload['surname'] = data['surname']
+        payload['roles'] = data['role']
+        payload['type'] = 'access'
+        payload['iat'] = int(now.timestamp())
+        payload['nbf'] = int(now.timestamp())
+        payload['exp'] = int((now + datetime.timedelta(minutes=JWTAuth.EXPIRATION)).timestamp())
+
+        token = jwt.encode(payload, JWTAuth.SECRET_KEY, algorithm=JWTAuth.ALGORITHM)
+        return token
+
+    # function that returns claims of the given token, or None when the token is expired or invalid
+    @staticmethod
+    def validate_token(token: str):
+        # tokens verified before are answered from the cache until they expire
+        claims = JWTAuth.cache.get(token)
+        if claims is not None:
+            return claims
+
+        try:
+            claims = Claims.from_payload(jwt.decode(token, JWTAuth.SECRET_KEY, algorithms=[JWTAuth.ALGORITHM]))
+        except jwt.ExpiredSignatureError:
+            print("Token expired.")
+            return None
+        except (jwt.InvalidTokenError, KeyError):
+            print("Invalid token.")
+            return None
+
+        JWTAuth.cache.put(token, claims)
+        return claims
@@ -0,0 +1,67 @@
+# benchmark for creating order contracts on a running Ganache
+# compares one OrderContract deployment per order with orders created in batches in the OrderRegistry
+# gas is measured as the drop of the owners balance, since every transaction pays a gas price of 1 gwei
+#
+# python contract_modes.py --provider http://localhost:8545 --orders 200 --batch 20
+
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+CUSTOMER = Path(__file__).resolve().parent.parent / "store system" / "customer"
+sys.path.insert(0, str(CUSTOMER))
+
+from blockchain import GanacheClient
+
+
+def run(client, mode, orders, batch):
+    client.mode = mode
+    if mode == "registry":
+        # the registry is deployed once for every order, so its deployment is left out
+        client.get_registry_address(deploy=True)
+
+    owner, _ = client.get_owner_account()
+    balance = client.w3.eth.get_balance(owner)
+    gas_price = client.w3.to_wei("1", "gwei")
+
+    start = time.perf_counter()
+    created = 0
+    for first in range(0, len(orders), batch):
+        addresses = client.deploy_orders(orders[first:first + batch])
+        created += sum(1 for address in addresses if address)
+    elapsed = time.perf_counter() - start
+
+    gas = (balance - client.w3.eth.get_balance(owner)) // gas_price
+    return created, elapsed, gas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--provider", default="http://localhost:8545")
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=20)
+    args = parser.parse_args()
+
+    # the client compiles contract.sol from the working directory
+    os.chdir(CUSTOMER)
+    client = GanacheClient(provider_url=args.provider)
+    customer = client.w3.eth.accounts[0]
+
+    # order ids start from the current time, so repeated runs do not hit orders already in the registry
+    first_id = int(time.time() * 1000)
+    orders = [(first_id + index, customer, Decimal("12.50")) for index in range(args.orders)]
+
+    print(f"{args.orders} orders, batches of {args.batch}")
+    for mode in ["contract", "registry"]:
+        created, elapsed, gas = run(client, mode, orders, args.batch)
+        print(
+            f"{mode:>8}: {created} created in {elapsed:.2f}s, "
+            f"{created / elapsed:.1f} orders/s, {gas // max(created, 1)} gas per order"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# benchmark for the contract loading done by GanacheClient at startup
+# compares compiling contract.sol with solc against loading the artifact built with the image
+# no Ganache is needed, the client does not connect before the first request
+#
+# python contract_startup.py --service customer --repeat 20
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+STORE = Path(__file__).resolve().parent.parent / "store system"
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--service", choices=["owner", "customer", "courier"], default="customer")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(STORE / args.service))
+    from blockchain import GanacheClient
+
+    # work on a copy, so the artifact of the service directory is left alone
+    directory = Path(tempfile.mkdtemp())
+    shutil.copy(STORE / args.service / "contract.sol", directory / "contract.sol")
+    os.chdir(directory)
+    try:
+        # without an artifact every start compiles the contract, as before
+        compiled = []
+        for _ in range(args.repeat):
+            Path("contract.json").unlink(missing_ok=True)
+            compiled.append(timed(GanacheClient))
+
+        # the last start has written the artifact, later starts only read it
+        loaded = [timed(GanacheClient) for _ in range(args.repeat)]
+    finally:
+        os.chdir(STORE)
+        shutil.rmtree(directory)
+
+    print(f"{args.service}, {args.repeat} starts")
+    print(f"compile:  median {statistics.median(compiled) * 1000:.1f} ms")
+    print(f"artifact: median {statistics.median(loaded) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmark for reading the state of many order contracts on a running Ganache
+# compares one getOrderState call per contract with the JSON-RPC batches of get_contract_statuses
+#
+# python contract_status_batch.py --provider http://localhost:8545 --orders 300
+
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+CUSTOMER = Path(__file__).resolve().parent.parent / "store system" / "customer"
+sys.path.insert(0, str(CUSTOMER))
+
+from blockchain import GanacheClient
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--provider", default="http://localhost:8545")
+    parser.add_argument("--orders", type=int, default=300)
+    parser.add_argument("--batch", type=int, default=200)
+    args = parser.parse_args()
+
+    # the client loads contract.sol from the working directory
+    os.chdir(CUSTOMER)
+    client = GanacheClient(provider_url=args.provider)
+    customer = client.w3.eth.accounts[0]
+
+    # deploy the contracts to read
+    addresses = []
+    while len(addresses) < args.orders:
+        count = min(50, args.orders - len(addresses))
+        addresses.extend(client.deploy_contracts([(customer, Decimal("12.50"))] * count))
+    orders = [(address, index) for index, address in enumerate(addresses) if address]
+
+    start = time.perf_counter()
+    sequential = [client.get_contract_status(address, order_id) for address, order_id in orders]
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = client.get_contract_statuses(orders, args.batch)
+    batched_time = time.perf_counter() - start
+
+    assert batched == sequential, "batched statuses differ from sequential ones"
+
+    print(f"{len(orders)} contracts")
+    print(f"sequential: {sequential_time * 1000:.1f} ms")
+    print(f"batched:    {batched_time * 1000:.1f} ms ({args.batch} calls per request)")
+
+
+if __name__ == "__main__":
+    main()
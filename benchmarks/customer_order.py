@@ -0,0 +1,91 @@
+# benchmark for validating and creating a large /order cart
+# compares the original per-line product lookups with the batched lookup of CustomerDatabaseService
+#
+# python customer_order.py --lines 1000
+
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "store system" / "owner"))
+sys.path.insert(1, str(Path(__file__).resolve().parent.parent / "store system" / "customer"))
+
+from flask import Flask
+from sqlalchemy.exc import SAWarning
+from orm import db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales, ContractState, PayoutOutbox, PayoutStatus
+from owner_database_service import OwnerDatabaseService
+from customer_database_service import CustomerDatabaseService
+
+
+# original implementation, every line is looked up once to validate it and once more to create the order
+def legacy_order(service, products, email):
+    for index, product in enumerate(products):
+        product_record = service.Product.query.filter_by(id=product['id']).first()
+        if not product_record:
+            return f"Invalid product for request number {index}.", 400
+
+    order = service.Order(email=email, status=service.OrderStatus.CREATED, address="")
+    for index, product in enumerate(products):
+        product_record = service.Product.query.filter_by(id=product['id']).first()
+        order_product = service.OrderProduct(product=product_record, quantity=float(product['quantity']))
+        order.products.append(order_product)
+
+    service.db.session.add(order)
+    service.db.session.commit()
+
+    return order.id, 200
+
+
+def batched_order(service, products, email):
+    records, status = service.check_products(products)
+    if status != 200:
+        return records, status
+    return service.make_order(products, email, records)
+
+
+def measure(app, function, products, repeat):
+    with app.app_context():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            message, status = function(products, "customer@store.com")
+            if status != 200:
+                raise RuntimeError(message)
+        return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    warnings.filterwarnings("ignore", category=SAWarning)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-uri", default="sqlite:///:memory:")
+    parser.add_argument("--lines", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=10)
+    arguments = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = arguments.database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    models = (db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales)
+    service = CustomerDatabaseService(*models, ContractState, PayoutOutbox, PayoutStatus)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        OwnerDatabaseService(*models).add_products(
+            [([f"Category{index % 20}"], f"Product{index}", "1.99") for index in range(arguments.lines)]
+        )
+        ids = [id for id, in db.session.query(Product.id)]
+
+    products = [{"id": id, "quantity": 1 + index % 5} for index, id in enumerate(ids)]
+
+    before = measure(app, lambda rows, email: legacy_order(service, rows, email), products, arguments.repeat)
+    after = measure(app, lambda rows, email: batched_order(service, rows, email), products, arguments.repeat)
+    print(f"{arguments.lines} lines  before {before:8.1f} ms/order  after {after:8.1f} ms/order")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# benchmark for the customer /search lookup
+# compares the original ilike('%text%') queries with the trigram SearchIndex of CustomerDatabaseService
+#
+# python customer_search.py --sizes 10000 100000 1000000
+
+import argparse
+import random
+import sys
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "store system" / "owner"))
+sys.path.insert(1, str(Path(__file__).resolve().parent.parent / "store system" / "customer"))
+
+from flask import Flask
+from sqlalchemy.exc import SAWarning
+from orm import db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales, ContractState, PayoutOutbox, PayoutStatus
+from owner_database_service import OwnerDatabaseService
+from customer_database_service import CustomerDatabaseService
+from search_index import SearchIndex
+
+WORDS = ["apple", "banana", "cherry", "grape", "lemon", "mango", "melon", "orange", "peach", "pear", "plum", "kiwi"]
+
+
+# original implementation, both lookups scan the whole tables
+def legacy_search_for_products(service, name, category):
+    if name == "" and category == "":
+        return []
+
+    product_query = service.Product.query
+    if name:
+        product_query = product_query.filter(service.Product.name.ilike(f"%{name}%"))
+    if category:
+        product_query = product_query.join(service.Product.categories).filter(service.Category.name.ilike(f"%{category}%"))
+
+    products = product_query.distinct().all()
+    products = [
+        {
+            "id": product.id,
+            "name": product.name,
+            "price": float(product.price),
+            "categories": [c.name for c in product.categories]
+        }
+        for product in products
+    ]
+
+    category_query = service.Category.query
+    if category:
+        category_query = category_query.filter(service.Category.name.ilike(f"%{category}%"))
+    if name:
+        category_query = category_query.join(service.Category.products).filter(service.Product.name.ilike(f"%{name}%"))
+
+    categories = category_query.distinct().all()
+    categories = [c.name for c in categories]
+
+    return {"categories": categories, "products": products}
+
+
+# function that generates parsed CSV lines with random product names
+def generate_products(size, categories=200):
+    generator = random.Random(size)
+    return [
+        (
+            [f"Category {generator.choice(WORDS)} {index % categories}"],
+            f"{generator.choice(WORDS)} {generator.choice(WORDS)} {index}",
+            "1.99"
+        )
+        for index in range(size)
+    ]
+
+
+# function that returns the average latency of given function over the queries in milliseconds
+def measure(function, queries, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for name, category in queries:
+            function(name, category)
+    return (time.perf_counter() - start) / (repeat * len(queries)) * 1000
+
+
+def main():
+    warnings.filterwarnings("ignore", category=SAWarning)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-uri", default="sqlite:///:memory:")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = arguments.database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    models = (db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales)
+
+    # selective queries, the cost of the original version is dominated by the table scans
+    queries = [("apple kiwi 12", ""), ("melon plum 99", "lemon"), ("", "pear 199"), ("kiwi 4242", "")]
+
+    for size in arguments.sizes:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            OwnerDatabaseService(*models).add_products(generate_products(size))
+
+            service = CustomerDatabaseService(*models, ContractState, PayoutOutbox, PayoutStatus)
+
+            # check that both versions return the same result, the original query does not order categories
+            for name, category in queries:
+                expected = legacy_search_for_products(service, name, category)
+                result = service.search_for_products(name, category)
+                if result["products"] != expected["products"] or sorted(result["categories"]) != sorted(expected["categories"]):
+                    raise RuntimeError(f"Different result for name={name!r} category={category!r}")
+
+            start = time.perf_counter()
+            index = SearchIndex(db, Product, Category, ProductCategory)
+            index.refresh()
+            build = time.perf_counter() - start
+
+            before = measure(lambda name, category: legacy_search_for_products(service, name, category), queries, arguments.repeat)
+            after = measure(service.search_for_products, queries, arguments.repeat)
+
+        print(f"{size:>8} products  index build {build:6.2f}s  before {before:9.2f} ms/search  after {after:9.2f} ms/search")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmark for the token check done by every request of the user and store services
+# compares decoding and verifying every token, as before, with the cache of verified tokens
+# tokens of --users users are checked in turns, like requests of users that are logged in
+#
+# python jwt_auth.py --users 100 --requests 100000 --cache-size 10000
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import jwt
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def run(validate, tokens, requests):
+    start = time.perf_counter()
+    for i in range(requests):
+        validate(tokens[i % len(tokens)])
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--cache-size", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("JWT", "benchmark-secret-key-of-32-bytes!")
+    os.environ["JWT_CACHE_SIZE"] = str(args.cache_size)
+    sys.path.insert(0, str(ROOT))
+    from auth import Claims, JWTAuth
+
+    tokens = [
+        JWTAuth.generate_token({
+            "email": f"user{i}@store.com", "forename": "User", "surname": str(i), "role": "customer",
+        })
+        for i in range(args.users)
+    ]
+
+    # check done before the cache, every token is decoded and its signature verified
+    def uncached(token):
+        decoded = jwt.decode(token, JWTAuth.SECRET_KEY, algorithms=[JWTAuth.ALGORITHM])
+        return Claims.from_payload(decoded)
+
+    before = [run(uncached, tokens, args.requests) for _ in range(args.repeat)]
+    after = [run(JWTAuth.validate_token, tokens, args.requests) for _ in range(args.repeat)]
+
+    before_us = statistics.median(before) * 1e6
+    after_us = statistics.median(after) * 1e6
+    print(f"users: {args.users}, requests: {args.requests}, cache size: {args.cache_size}")
+    print(f"decode every token: {before_us:8.2f} us per request")
+    print(f"token cache:        {after_us:8.2f} us per request ({before_us / after_us:.1f}x)")
+    print(f"cache: {JWTAuth.cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
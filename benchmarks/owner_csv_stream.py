@@ -0,0 +1,116 @@
+# benchmark for parsing the owner /update CSV upload
+# compares peak memory and throughput of reading the whole upload into memory
+# with the streaming check_csv/parse_csv pipeline used by owner_api
+#
+# python owner_csv_stream.py --lines 1000000
+# python owner_csv_stream.py --lines 200000 --import
+
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import islice
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "store system" / "owner"))
+# owner_api imports the shared auth package from the repository root
+sys.path.insert(1, str(Path(__file__).resolve().parent.parent))
+
+from flask import Flask
+from werkzeug.datastructures import FileStorage
+from orm import db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales
+from owner_database_service import OwnerDatabaseService
+from owner_api import check_csv, parse_csv
+
+
+# original implementation, the whole upload is decoded into memory and parsed into a list
+def legacy_parse_csv(file):
+    stream = io.StringIO(file.stream.read().decode("utf-8"))
+    csv_reader = csv.reader(stream)
+
+    products = []
+    for index, row in enumerate(csv_reader):
+        if len(row) != 3:
+            return f"Incorrect number of values on line {index}.", 400
+
+        categories = [c.strip() for c in row[0].split('|')]
+        name = row[1].strip()
+        price = row[2].strip()
+
+        products.append((categories, name, price))
+
+    return products, 200
+
+
+# function that writes a catalog with given number of lines to a temporary file
+def generate_csv(lines):
+    file = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, newline="")
+    with file:
+        writer = csv.writer(file)
+        for index in range(lines):
+            writer.writerow([f"Category{index % 50}|Category{(index * 7 + 1) % 50}", f"Product{index}", f"{index % 1000 + 1}.99"])
+    return file.name
+
+
+# function that runs given pipeline on the file and returns elapsed time and peak traced memory
+def measure(path, pipeline):
+    with open(path, "rb") as stream:
+        file = FileStorage(stream=stream, filename="catalog.csv")
+        tracemalloc.start()
+        start = time.perf_counter()
+        pipeline(file)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--import", dest="with_import", action="store_true", help="also insert products into the database")
+    parser.add_argument("--database-uri", default="sqlite:///:memory:")
+    arguments = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = arguments.database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    service = OwnerDatabaseService(db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales)
+
+    def legacy(file):
+        products, status = legacy_parse_csv(file)
+        if arguments.with_import:
+            service.add_products(products, arguments.chunk_size)
+
+    def streaming(file):
+        check_csv(file)
+        if arguments.with_import:
+            service.add_products(parse_csv(file), arguments.chunk_size)
+        else:
+            products = parse_csv(file)
+            while list(islice(products, arguments.chunk_size)):
+                pass
+
+    path = generate_csv(arguments.lines)
+    size = os.path.getsize(path)
+    print(f"{arguments.lines} lines, {size / 2 ** 20:.1f} MiB")
+
+    try:
+        for label, pipeline in (("before", legacy), ("after", streaming)):
+            with app.app_context():
+                db.drop_all()
+                db.create_all()
+                elapsed, peak = measure(path, pipeline)
+            print(f"{label:>7}: {elapsed:8.2f}s  {arguments.lines / elapsed:10.0f} lines/s  peak {peak / 2 ** 20:8.1f} MiB")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
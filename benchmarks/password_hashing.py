@@ -0,0 +1,59 @@
+# benchmark for password verification done by /login at several scrypt cost settings
+# logins are sent by --threads threads, like concurrent requests of the Flask server, and verified by the hasher's pool
+# reports logins per second and per worker process, a worker uses one core
+#
+# python password_hashing.py --log-n 12 13 14 15 --workers 4 --logins 200
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "user system"))
+
+from password_hasher import PasswordHasher
+
+PASSWORD = "Aaaaaaaa1"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log-n", type=int, nargs="+", default=[12, 13, 14, 15])
+    parser.add_argument("-r", type=int, default=8)
+    parser.add_argument("-p", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--logins", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"workers: {args.workers}, threads: {args.threads}, logins: {args.logins}")
+    print(f"{'log_n':>5} {'memory':>8} {'ms/login':>9} {'logins/s':>9} {'per core':>9}")
+    for log_n in args.log_n:
+        hasher = PasswordHasher(log_n=log_n, r=args.r, p=args.p, workers=args.workers, queue_timeout=None)
+        stored = hasher.hash(PASSWORD)
+
+        # warm the workers up, so process start is not measured
+        with ThreadPoolExecutor(args.workers) as executor:
+            list(executor.map(lambda _: hasher.verify(stored, PASSWORD), range(args.workers)))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as executor:
+            results = list(executor.map(lambda _: hasher.verify(stored, PASSWORD), range(args.logins)))
+        elapsed = time.perf_counter() - start
+        assert all(results)
+
+        # single login latency without contention
+        single = time.perf_counter()
+        hasher.verify(stored, PASSWORD)
+        single = time.perf_counter() - single
+
+        rate = args.logins / elapsed
+        memory = 128 * args.r * 2 ** log_n / 2 ** 20
+        print(f"{log_n:>5} {memory:>6.0f}MB {single * 1000:>9.1f} {rate:>9.1f} {rate / args.workers:>9.1f}")
+        hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,45 @@
-from solcx import install_solc, set_solc_version, compile_standard
-from web3 import Web3, HTTPProvider
+from web3 import Web3
 from pathlib import Path
+from contract_artifact import load_contracts
+from nonce_manager import NonceManager
+from contract_registry import ContractRegistry
+from address_cache import AddressCache
+from rpc_provider import PooledHTTPProvider
+from receipt_tracker import ReceiptTracker
 
 class GanacheClient:
 
     _instance = None
 
-    def __init__(self, provider_url="http://ganache:8545"):
+    # mode "contract" deploys a contract for every order, mode "registry" keeps orders in one OrderRegistry contract
+    def __init__(self, provider_url="http://ganache:8545", database_uri=None, mode="contract", address_cache_ttl=5.0, address_cache_size=10000, provider_options=None):
         # create Web3 Client
+        # its connections are pooled and time out, see PooledHTTPProvider for the options
         self.provider_url = provider_url
-        self.w3 = Web3(HTTPProvider(provider_url))
+        self.w3 = Web3(PooledHTTPProvider(provider_url, **(provider_options or {})))
+        self.rpc_metrics = self.w3.provider.metrics
+        # receipts of every sent transaction are polled together by one thread
+        self.receipts = ReceiptTracker(self.w3)
+
+        # nonces of the owners account are shared through the database by every service signing with it
+        self.database_uri = database_uri
+        self.nonces = None
+
+        # results of check_address, so an account is not asked for its balance on every request
+        self.address_cache = AddressCache(address_cache_ttl, address_cache_size)
 
         # compile the contract
         self.contract_file = Path("contract.sol")
         if not self.contract_file.exists():
             raise FileNotFoundError("Contract file not found")
 
-        self.abi, self.bytecode = self.compile_contract()
+        contracts = self.compile_contract()
+        self.abi, self.bytecode = contracts["OrderContract"]
+        self.registry_abi, self.registry_bytecode = contracts["OrderRegistry"]
+
+        # address of the registry is shared through the database by every service
+        self.mode = mode
+        self.contracts = ContractRegistry(database_uri)
 
     # singleton
     def __new__(cls, *args, **kwargs):
@@ -24,37 +47,13 @@ class GanacheClient:
             cls._instance = super().__new__(cls)
         return cls._instance
 
+    # function that returns ABI and Bytecode of every contract
+    # they are read from the artifact built with the image, solc only runs when contract.sol has changed
     def compile_contract(self):
-        # set version
-        install_solc("0.8.0")
-        set_solc_version("0.8.0")
-
-        # read the contract content
-        source = self.contract_file.read_text()
-
-        # compile the contract
-        compiled_sol = compile_standard({
-            "language": "Solidity",
-            "sources": {
-                "contract.sol": {
-                    "content": source
-                }
-            },
-            "settings": {
-                "outputSelection": {
-                    "*": {
-                        "*": ["abi", "evm.bytecode.object"]
-                    }
-                }
-            }
-        })
-
-        # extract the ABI and Bytecode of the contract
-        contract_name = "OrderContract"
-        abi = compiled_sol["contracts"]["contract.sol"][contract_name]["abi"]
-        bytecode = compiled_sol["contracts"]["contract.sol"][contract_name]["evm"]["bytecode"]["object"]
-
-        return abi, bytecode
+        return {
+            contract_name: (contract["abi"], contract["bytecode"])
+            for contract_name, contract in load_contracts(self.contract_file).items()
+        }
 
     def get_owner_account(self):
         # first 10 accounts are created when initialized the system, and owners is 11th
@@ -64,44 +63,141 @@ class GanacheClient:
 
         return accounts[-1], "0xb64be88dd6b89facf295f4fd0dda082efcbe95a2bb4478f5ee582b7efe88cf60" # private key from the test
 
+    # function that signs and sends a transaction from the owners account and returns its hash
+    # build receives the owners address and the nonce to use and returns the transaction
+    def send_owner_transaction(self, build, retries=3):
+        owner, private_key = self.get_owner_account() # get the owners address and private key
+        if self.nonces is None:
+            self.nonces = NonceManager(self.w3, owner, self.database_uri)
+
+        # sign the transaction with owners private key and send it
+        def send(nonce, build=build):
+            transaction = build(owner, nonce)
+            signed_transaction = self.w3.eth.account.sign_transaction(transaction, private_key=private_key)
+            return self.w3.eth.send_raw_transaction(signed_transaction.raw_transaction)
+
+        # nonces left unused by failed transactions are taken by transfers of nothing to the owner
+        def transfer(owner, nonce):
+            return {
+                "from": owner,
+                "to": owner,
+                "value": 0,
+                "gas": 21000,
+                "gasPrice": self.w3.to_wei("1", "gwei"),
+                "nonce": nonce,
+                "chainId": self.w3.eth.chain_id,
+            }
+
+        return self.nonces.submit(send, retries, fill=lambda nonce: send(nonce, transfer))
+
+    # function that returns address of the order registry
+    # when deploy is set and there is no registry yet, it is deployed
+    def get_registry_address(self, deploy=False):
+        registry_address = self.contracts.get("OrderRegistry")
+        if registry_address or not deploy:
+            return registry_address
+
+        contract = self.w3.eth.contract(abi=self.registry_abi, bytecode=self.registry_bytecode)
+
+        # create transaction to deploy the registry
+        def build(owner, nonce):
+            return contract.constructor().build_transaction({
+                "from": owner,
+                "gas": 2_000_000,
+                "gasPrice": self.w3.to_wei("1", "gwei"),
+                "nonce": nonce,
+            })
+
+        # sign and send the transaction and wait for the receipt
+        transaction_hash = self.send_owner_transaction(build)
+        receipt = self.receipts.wait(transaction_hash)
+
+        # if another service has deployed a registry in the meantime, its registry is used
+        return self.contracts.add("OrderRegistry", receipt.contractAddress)
+
+    # function that checks whether given contract address is the address of the order registry
+    def is_registry(self, contract_address):
+        return contract_address != "" and contract_address == self.get_registry_address()
+
+    # function that returns the contract function handling the given order
+    # orders in the registry are selected by their id, other orders have a contract of their own
+    def order_function(self, contract_address, order_id, name, *args):
+        if self.is_registry(contract_address):
+            contract = self.w3.eth.contract(address=contract_address, abi=self.registry_abi)
+            return contract.functions[name](int(order_id), *args)
+
+        contract = self.w3.eth.contract(address=contract_address, abi=self.abi)
+        return contract.functions[name](*args)
+
     # function to check if given address is valid and whether account associated with it has any means
+    # results are cached, see AddressCache
     def check_address(self, address):
         if not self.w3.is_address(address):
             return False
-        balance = self.w3.eth.get_balance(address)
-        return balance > 0
+        return self.address_cache.lookup(address, lambda address: self.w3.eth.get_balance(address) > 0)
 
     # function to assign courier to the contract
-    def assign_courier(self, contract_address, courier_address):
+    def assign_courier(self, contract_address, courier_address, order_id=None):
         if not self.check_address(courier_address):
             return False
 
-        owner, private_key = self.get_owner_account() # get the owners address and private key
-        contract = self.w3.eth.contract(address=contract_address, abi=self.abi) # get the contract
-
         try:
             # create transaction for bindCourier method in the contract
-            transaction = contract.functions.bindCourier(courier_address).build_transaction({
-                "from": owner,
-                "gas": 200_000,
-                "gasPrice": self.w3.to_wei("1", "gwei"),
-                "nonce": self.w3.eth.get_transaction_count(owner),
-            })
-
-            # sign the transaction with owners private key
-            signed_transaction = self.w3.eth.account.sign_transaction(transaction, private_key=private_key)
-            # get the transaction hash
-            transaction_hash = self.w3.eth.send_raw_transaction(signed_transaction.raw_transaction)
+            def build(owner, nonce):
+                return self.order_function(contract_address, order_id, "bindCourier", courier_address).build_transaction({
+                    "from": owner,
+                    "gas": 200_000,
+                    "gasPrice": self.w3.to_wei("1", "gwei"),
+                    "nonce": nonce,
+                })
+
+            # sign and send the transaction and get its hash
+            transaction_hash = self.send_owner_transaction(build)
             # wait for the receipt
-            self.w3.eth.wait_for_transaction_receipt(transaction_hash)
+            self.receipts.wait(transaction_hash)
 
             return True
 
         except Exception:
             return False
 
-    # function to return status of a given contract
-    def get_contract_status(self, contract_address):
-        contract = self.w3.eth.contract(address=contract_address, abi=self.abi)
-        owner, customer, courier, price, paid, delivered, courier_bound = contract.functions.getOrderState().call()
-        return owner, customer, courier, price, paid, delivered, courier_bound
\ No newline at end of file
+    # function to return status of a given order
+    def get_contract_status(self, contract_address, order_id=None):
+        owner, customer, courier, price, paid, delivered, courier_bound = self.order_function(
+            contract_address, order_id, "getOrderState"
+        ).call()
+        return owner, customer, courier, price, paid, delivered, courier_bound
+
+    # function to return status of many orders given as (contract address, order id)
+    # the calls are sent as JSON-RPC batches, so every batch_size orders take a single round trip
+    # status of an order whose state can not be read is None
+    def get_contract_statuses(self, orders, batch_size=200):
+        registry_address = self.get_registry_address()
+        registry = self.w3.eth.contract(address=registry_address, abi=self.registry_abi) if registry_address else None
+
+        # create getOrderState call of every order
+        functions = []
+        for contract_address, order_id in orders:
+            if registry is not None and contract_address == registry_address:
+                functions.append(registry.functions.getOrderState(int(order_id)))
+            else:
+                contract = self.w3.eth.contract(address=contract_address, abi=self.abi)
+                functions.append(contract.functions.getOrderState())
+
+        statuses = []
+        for start in range(0, len(functions), batch_size):
+            batch = functions[start:start + batch_size]
+            try:
+                with self.w3.batch_requests() as requests:
+                    for function in batch:
+                        requests.add(function)
+                    statuses.extend([tuple(response) for response in requests.execute()])
+            except Exception:
+                # a failing call fails the whole batch, so its calls are repeated one by one
+                for function in batch:
+                    try:
+                        statuses.append(tuple(function.call()))
+                    except Exception:
+                        statuses.append(None)
+
+        return statuses
\ No newline at end of file
@@ -0,0 +1,70 @@
+import threading
+import time
+from sqlalchemy import create_engine, MetaData, Table, Column, String, select, insert
+from sqlalchemy.exc import IntegrityError
+
+metadata = MetaData()
+
+# addresses of contracts shared by every order, such as the order registry
+contracts = Table(
+    'ContractRegistry', metadata,
+    Column('name', String(64), primary_key=True),
+    Column('address', String(42), nullable=False),
+)
+
+
+# store of shared contract addresses
+# with a database every service sees the same contracts, otherwise they are kept in memory
+class ContractRegistry:
+
+    def __init__(self, database_uri=None, missing_ttl=5.0):
+        self.lock = threading.Lock()
+        self.addresses = {}
+
+        # names not found in the database are not looked up again for missing_ttl seconds
+        self.missing_ttl = missing_ttl
+        self.missing = {}  # name -> time of the lookup that did not find it
+
+        self.engine = None
+        if database_uri:
+            self.engine = create_engine(database_uri, pool_pre_ping=True)
+            metadata.create_all(self.engine)
+
+    # function that returns address of the contract with the given name or None
+    def get(self, name):
+        with self.lock:
+            if name in self.addresses or self.engine is None:
+                return self.addresses.get(name)
+            checked_at = self.missing.get(name)
+            if checked_at is not None and time.monotonic() - checked_at < self.missing_ttl:
+                return None
+
+        with self.engine.connect() as connection:
+            address = connection.execute(select(contracts.c.address).where(contracts.c.name == name)).scalar()
+
+        with self.lock:
+            if address:
+                self.addresses[name] = address
+                self.missing.pop(name, None)
+            else:
+                self.missing[name] = time.monotonic()
+        return address
+
+    # function that stores the address unless another one has been stored first
+    # returns the address every service should use
+    def add(self, name, address):
+        if self.engine is None:
+            with self.lock:
+                return self.addresses.setdefault(name, address)
+
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(insert(contracts).values(name=name, address=address))
+        except IntegrityError:
+            # another service has stored its contract first
+            pass
+
+        with self.lock:
+            self.addresses.pop(name, None)
+            self.missing.pop(name, None)
+        return self.get(name)
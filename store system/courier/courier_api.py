@@ -1,9 +1,9 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, g
 import os
 
 from blockchain import GanacheClient
-from jwtauth import JWTAuth
-from orm import db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory
+from auth import auth_metrics, require_role
+from orm import db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ContractState
 from courier_database_service import CourierDatabaseService
 
 # read the environment variables
@@ -21,42 +21,59 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
 # create service for interacting with database
-courierDatabaseService = CourierDatabaseService(db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory)
+courierDatabaseService = CourierDatabaseService(db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ContractState)
+# options of the connection to the blockchain
+provider_options = {
+    "pool_size": int(os.getenv("RPC_POOL_SIZE", 20)),
+    "connect_timeout": float(os.getenv("RPC_CONNECT_TIMEOUT", 3)),
+    "read_timeout": float(os.getenv("RPC_READ_TIMEOUT", 30)),
+    "retries": int(os.getenv("RPC_RETRIES", 3)),
+}
 # create service for interacting with the blockchain
-ganacheClient = GanacheClient()
-
-# function for JWT authentication
-def auth(role):
-    # read the token from the header
-    token = request.headers.get('Authorization')
-    if not token:
-        return "", "", 401
-
-    # get email and role of the caller from the JWT
-    email, r = JWTAuth.validate_token(token.replace('Bearer ', ''))
-    if not email or not r or r != role:
-        return "", "", 401
-
-    return email, role, 200
+ganacheClient = GanacheClient(
+    database_uri=app.config['SQLALCHEMY_DATABASE_URI'],
+    address_cache_ttl=float(os.getenv("ADDRESS_CACHE_TTL", 5)),
+    address_cache_size=int(os.getenv("ADDRESS_CACHE_SIZE", 10000)),
+    provider_options=provider_options
+)
+
+# every request checks each account address at most once
+@app.before_request
+def open_address_scope():
+    g.address_scope = ganacheClient.address_cache.open_scope()
+
+@app.teardown_request
+def close_address_scope(exception):
+    ganacheClient.address_cache.close_scope(g.pop('address_scope', None))
 
 # endpoint returns list of orders that are not taken by the courier
+# optional parameter paid adds whether the customer has paid each order, read from the blockchain in batches
 @app.route('/orders_to_deliver', methods=['GET'])
+@require_role('courier')
 def orders_to_deliver():
-    email, role, status = auth('courier')
-    if status != 200:
-        return jsonify({'msg': "Missing Authorization Header"}), status
-
     orders = courierDatabaseService.orders_to_deliver()
+
+    if request.args.get('paid', '').lower() in ('1', 'true'):
+        order_ids = [order['id'] for order in orders]
+        # payments seen by the indexer are final, only the other orders are read from the blockchain
+        paid = courierDatabaseService.get_paid_orders(order_ids)
+        addresses = courierDatabaseService.get_addresses([order_id for order_id in order_ids if order_id not in paid])
+        # orders whose contract is not deployed yet can not have been paid
+        deployed = [order for order in orders if addresses.get(order['id'])]
+        statuses = ganacheClient.get_contract_statuses([(addresses[order['id']], order['id']) for order in deployed])
+
+        for order in orders:
+            order['paid'] = order['id'] in paid
+        for order, contract_status in zip(deployed, statuses):
+            order['paid'] = contract_status is not None and contract_status[4]
+
     return jsonify({"orders": orders}), 200
 
 # endpoint receives id of the order that courier wants to pick up and his account address
 # endpoint marks order as picked by the courier and binds his account address to the smart contract related to the given order
 @app.route('/pick_up_order', methods=['POST'])
+@require_role('courier')
 def pick_up_order():
-    email, role, status = auth('courier')
-    if status != 200:
-        return jsonify({'msg': "Missing Authorization Header"}), status
-
     data = request.get_json()
     if not data or 'id' not in data:
         return jsonify({"message": "Missing order id."}), 400
@@ -79,16 +96,30 @@ def pick_up_order():
 
     # check whether customer has paid
     contract_address = courierDatabaseService.get_address(order_id)
-    owner, customer, courier, price, paid, delivered, courier_bound = ganacheClient.get_contract_status(contract_address)
-    if not paid:
-        return jsonify({"message": "Transfer not complete."}), 400
+    if contract_address == "":
+        return jsonify({"message": "Contract not deployed yet."}), 400
+    # payments seen by the indexer are final, otherwise the contract is read in case the indexer is behind
+    if not courierDatabaseService.get_paid_orders([order_id]):
+        owner, customer, courier, price, paid, delivered, courier_bound = ganacheClient.get_contract_status(contract_address, order_id)
+        if not paid:
+            return jsonify({"message": "Transfer not complete."}), 400
 
     # mark order as picked
     courierDatabaseService.pick_up_order(order_id)
     # bind courier to the smart contract
-    _ = ganacheClient.assign_courier(contract_address, address)
+    _ = ganacheClient.assign_courier(contract_address, address, order_id)
 
     return jsonify({"message": ""}), 200
 
+# endpoint returns counters of the service's caches, used for tuning their sizes and lifetimes
+@app.route('/metrics', methods=['GET'])
+@require_role('owner')
+def metrics():
+    return jsonify({
+        "address_cache": ganacheClient.address_cache.stats(),
+        "rpc": ganacheClient.rpc_metrics.stats(),
+        "auth": auth_metrics.stats(),
+    }), 200
+
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0", port=5003)
\ No newline at end of file
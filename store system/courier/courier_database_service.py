@@ -1,6 +1,6 @@
 
 class CourierDatabaseService:
-    def __init__(self, db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory):
+    def __init__(self, db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ContractState):
         self.db = db
         self.Product = Product
         self.Category = Category
@@ -8,6 +8,7 @@ class CourierDatabaseService:
         self.OrderProduct = OrderProduct
         self.OrderStatus = OrderStatus
         self.ProductCategory = ProductCategory
+        self.ContractState = ContractState
 
     # function that returns all orders that have not been picked by any courier
     def orders_to_deliver(self):
@@ -25,12 +26,34 @@ class CourierDatabaseService:
         return "", 200
 
     # function that marks order as picked based on order id
+    # product sales counters stay the same since picked orders are still waiting for delivery
     def pick_up_order(self, id):
         order = self.Order.query.filter_by(id=id).first()
         order.status = self.OrderStatus.PENDING
         self.db.session.add(order)
         self.db.session.commit()
 
+    # function that returns addresses of smart contracts related to the given orders by order id
+    def get_addresses(self, order_ids, chunk_size=1000):
+        addresses = {}
+        for start in range(0, len(order_ids), chunk_size):
+            rows = self.db.session.query(self.Order.id, self.Order.address).filter(
+                self.Order.id.in_(order_ids[start:start + chunk_size])
+            )
+            addresses.update({order_id: address for order_id, address in rows})
+        return addresses
+
+    # function that returns ids of the given orders whose payment has been seen by the indexer
+    def get_paid_orders(self, order_ids, chunk_size=1000):
+        paid = set()
+        for start in range(0, len(order_ids), chunk_size):
+            rows = self.db.session.query(self.ContractState.order_id).filter(
+                self.ContractState.order_id.in_(order_ids[start:start + chunk_size]),
+                self.ContractState.paid.is_(True)
+            )
+            paid.update(order_id for order_id, in rows)
+        return paid
+
     # function that returns address of a smart contract related to the given order
     def get_address(self, order_id):
         order = self.Order.query.filter_by(id=order_id).first()
@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+# addresses already checked by the current request
+request_results = ContextVar("request_results", default=None)
+
+
+# cache of address checks, results are kept for ttl seconds and the least recently used ones are evicted first
+# within a request scope an address is checked at most once, whatever the ttl
+class AddressCache:
+
+    def __init__(self, ttl=5.0, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # address -> (result, expiration time)
+
+        self.hits = 0
+        self.request_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # function that starts a request scope and returns the token closing it
+    def open_scope(self):
+        return request_results.set({})
+
+    def close_scope(self, token):
+        if token is not None:
+            request_results.reset(token)
+
+    # function that returns the result for the address, calling check only when it is not cached
+    def lookup(self, address, check):
+        key = address.lower()
+
+        scope = request_results.get()
+        if scope is not None and key in scope:
+            with self.lock:
+                self.request_hits += 1
+            return scope[key]
+
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                result = entry[0]
+            else:
+                self.misses += 1
+                result = None
+
+        if result is None:
+            result = check(address)
+            with self.lock:
+                self.entries[key] = (result, time.monotonic() + self.ttl)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+
+        if scope is not None:
+            scope[key] = result
+        return result
+
+    # function that returns counters of the cache
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "request_hits": self.request_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.entries),
+                "ttl": self.ttl,
+                "max_size": self.max_size,
+            }
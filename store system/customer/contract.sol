@@ -11,6 +11,11 @@ contract OrderContract {
     bool public courierBound; // indicates whether courier has been bound
     bool public delivered; // indicates whether delivery is confirmed
 
+    // events mirrored into the store database by the indexer
+    event Paid(address indexed customer, uint amount);
+    event CourierBound(address indexed courier);
+    event Delivered(address indexed courier, uint ownerAmount, uint courierAmount);
+
     constructor (address _owner, address _customer, uint _price) {
         owner = _owner;
         customer = _customer;
@@ -26,12 +31,14 @@ contract OrderContract {
         require(!courierBound, "Courier already assigned");
         courier = _courier;
         courierBound = true;
+        emit CourierBound(_courier);
     }
 
     function payOrder() public payable {
         require(!paid, "Already paid");
         require(msg.value == price, "Incorrect payment amount");
         paid = true;
+        emit Paid(msg.sender, msg.value);
     }
 
     function confirmDelivery() public payable {
@@ -46,6 +53,7 @@ contract OrderContract {
 
         payable(owner).transfer(ownerAmount);
         payable(courier).transfer(courierAmount);
+        emit Delivered(courier, ownerAmount, courierAmount);
     }
 
     // helper functions
@@ -55,4 +63,92 @@ contract OrderContract {
         returns (address _owner, address _customer, address _courier, uint _price, bool _paid, bool _delivered, bool _courierBound) {
             return (owner, customer, courier, price, paid, delivered, courierBound);
         }
+}
+
+// registry keeping the state of every order in a single contract
+// orders are identified by their id in the store and many of them can be created in one transaction
+contract OrderRegistry {
+
+    struct Order {
+        address customer; // account of a customer paying the order
+        bool exists; // indicates whether the order has been created
+        bool paid; // indicates whether customer has paid
+        bool courierBound; // indicates whether courier has been bound
+        bool delivered; // indicates whether delivery is confirmed
+        address courier; // account of a courier assigned for the delivery
+        uint price; // price of the order in wei
+    }
+
+    address public owner; // account of a store owner
+    mapping(uint => Order) public orders; // orders by their id
+
+    // events mirrored into the store database by the indexer
+    event Paid(uint indexed id, address indexed customer, uint amount);
+    event CourierBound(uint indexed id, address indexed courier);
+    event Delivered(uint indexed id, address indexed courier, uint ownerAmount, uint courierAmount);
+
+    constructor () {
+        owner = msg.sender;
+    }
+
+    // core functions
+
+    // orders that already exist are skipped, so a batch can be sent again safely
+    function createOrders(uint[] calldata _ids, address[] calldata _customers, uint[] calldata _prices) external {
+        require(msg.sender == owner, "Only owner can create orders");
+        require(_ids.length == _customers.length && _ids.length == _prices.length, "Length mismatch");
+
+        for (uint i = 0; i < _ids.length; i++) {
+            Order storage order = orders[_ids[i]];
+            if (order.exists) {
+                continue;
+            }
+            order.customer = _customers[i];
+            order.price = _prices[i];
+            order.exists = true;
+        }
+    }
+
+    function bindCourier(uint _id, address _courier) public {
+        Order storage order = orders[_id];
+        require(order.exists, "Order does not exist");
+        require(!order.courierBound, "Courier already assigned");
+        order.courier = _courier;
+        order.courierBound = true;
+        emit CourierBound(_id, _courier);
+    }
+
+    function payOrder(uint _id) public payable {
+        Order storage order = orders[_id];
+        require(order.exists, "Order does not exist");
+        require(!order.paid, "Already paid");
+        require(msg.value == order.price, "Incorrect payment amount");
+        order.paid = true;
+        emit Paid(_id, msg.sender, msg.value);
+    }
+
+    function confirmDelivery(uint _id) public payable {
+        Order storage order = orders[_id];
+        require(order.paid, "Order not paid yet");
+        require(order.courierBound, "Courier not assigned");
+        require(!order.delivered, "Already delivered");
+
+        order.delivered = true;
+
+        uint ownerAmount = (order.price * 80) / 100;
+        uint courierAmount = order.price - ownerAmount;
+
+        payable(owner).transfer(ownerAmount);
+        payable(order.courier).transfer(courierAmount);
+        emit Delivered(_id, order.courier, ownerAmount, courierAmount);
+    }
+
+    // helper functions
+
+    function getOrderState(uint _id)
+        public view
+        returns (address _owner, address _customer, address _courier, uint _price, bool _paid, bool _delivered, bool _courierBound) {
+            Order storage order = orders[_id];
+            return (owner, order.customer, order.courier, order.price, order.paid, order.delivered, order.courierBound);
+        }
 }
\ No newline at end of file
@@ -1,9 +1,11 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, stream_with_context, g
 import os
-from jwtauth import JWTAuth
-from orm import db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory
+from auth import auth_metrics, require_role
+from orm import db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales, ContractState, PayoutOutbox, PayoutStatus
 from customer_database_service import CustomerDatabaseService
 from blockchain import GanacheClient
+from deployment_worker import DeploymentWorker
+from payout_worker import PayoutWorker
 
 # read the environment variables
 host = os.getenv("DB_HOST", "localhost")
@@ -19,32 +21,77 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 # initialize the database
 db.init_app(app)
 
+# seconds between checks of the product tables by /search, 0 checks with every search so new products show up at once
+SEARCH_CHECK_INTERVAL = float(os.getenv("SEARCH_CHECK_INTERVAL", 0))
 # create service for interacting with database
-customerDatabaseService = CustomerDatabaseService(db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory)
+customerDatabaseService = CustomerDatabaseService(
+    db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales, ContractState, PayoutOutbox, PayoutStatus,
+    search_check_interval=SEARCH_CHECK_INTERVAL
+)
+# options of the connection to the blockchain
+provider_options = {
+    "pool_size": int(os.getenv("RPC_POOL_SIZE", 20)),
+    "connect_timeout": float(os.getenv("RPC_CONNECT_TIMEOUT", 3)),
+    "read_timeout": float(os.getenv("RPC_READ_TIMEOUT", 30)),
+    "retries": int(os.getenv("RPC_RETRIES", 3)),
+}
 # create service for interacting with the blockchain
-ganacheClient = GanacheClient()
-
-# function for JWT authentication
-def auth(role):
-    token = request.headers.get('Authorization')
-    if not token:
-        return "", "", 401
-
-    email, r = JWTAuth.validate_token(token.replace('Bearer ', ''))
-    if not email or not r or r != role:
-        return "", "", 401
-
-    return email, role, 200
+ganacheClient = GanacheClient(
+    database_uri=app.config['SQLALCHEMY_DATABASE_URI'],
+    mode=os.getenv("CONTRACT_MODE", "contract"),
+    address_cache_ttl=float(os.getenv("ADDRESS_CACHE_TTL", 5)),
+    address_cache_size=int(os.getenv("ADDRESS_CACHE_SIZE", 10000)),
+    provider_options=provider_options
+)
+
+# every request checks each account address at most once
+@app.before_request
+def open_address_scope():
+    g.address_scope = ganacheClient.address_cache.open_scope()
+
+@app.teardown_request
+def close_address_scope(exception):
+    ganacheClient.address_cache.close_scope(g.pop('address_scope', None))
+
+# contracts are deployed inside the /order request (sync) or by a background worker (async)
+# sync is the default, since checks such as the bundled tests read the deployment right after /order
+CONTRACT_DEPLOYMENT = os.getenv("CONTRACT_DEPLOYMENT", "sync")
+# seconds /generate_invoice waits for a contract that is still being deployed before asking the client to retry
+# kept short, so requests are not held while transactions are mined
+MAX_CONTRACT_WAIT = 0.5
+CONTRACT_WAIT_TIMEOUT = min(float(os.getenv("CONTRACT_WAIT_TIMEOUT", 0.2)), MAX_CONTRACT_WAIT)
+# worker that deploys contracts of new orders in batches
+deploymentWorker = DeploymentWorker(
+    app, customerDatabaseService, ganacheClient,
+    batch_size=int(os.getenv("DEPLOYMENT_BATCH_SIZE", 20))
+)
+
+# deliveries are confirmed in smart contracts inside the /delivered request (sync) or by a background worker (async)
+# async answers after the commit of the status and the outbox row, sync answers once the payout is mined
+# sync is meant for checks that read the payout right after /delivered, failed confirmations are retried by the worker in both modes
+PAYOUTS = os.getenv("PAYOUTS", "sync")
+# worker that confirms deliveries from the payout outbox
+payoutWorker = PayoutWorker(
+    app, customerDatabaseService, ganacheClient,
+    batch_size=int(os.getenv("PAYOUT_BATCH_SIZE", 20))
+)
+
+# start the workers with the first request, so the reloader parent process does not run them
+@app.before_request
+def start_workers():
+    if CONTRACT_DEPLOYMENT == "async":
+        deploymentWorker.start()
+    payoutWorker.start()
+
+# maximum number of orders returned by one page of /status
+MAX_ORDERS_PAGE = 1000
 
 # endpoint receives product name and category name
 # endpoint returns list of categories which names contain given category name
 # and a list of products which names contain given product name
 @app.route('/search', methods=['GET'])
+@require_role('customer')
 def search():
-    email, role, status = auth('customer')
-    if status != 200:
-        return jsonify({'msg': "Missing Authorization Header"}), status
-
     # get names from the request body
     name = request.args.get('name')
     category = request.args.get('category')
@@ -52,39 +99,49 @@ def search():
     response = customerDatabaseService.search_for_products(name, category)
     return jsonify(response), 200
 
+# function that checks whether given value is a positive integer
+def is_positive_integer(value):
+    try:
+        return int(value) > 0
+    except Exception:
+        return False
+
 # function that check list of products for missing or invalid ids, missing or invalid quantities
 # and products that exist in the database
+# list is walked once, errors are reported in the same order as if every check walked the whole list
+# on success returns products from the database mapped by their ids
 def check_order_request(products):
+    missing_id = missing_quantity = invalid_id = invalid_quantity = None
     for index, product in enumerate(products):
         if 'id' not in product:
-            return f"Product id is missing for request number {index}.", 400
-    for index, product in enumerate(products):
-        if 'quantity' not in product:
-            return f"Product quantity is missing for request number {index}.", 400
-    for index, product in enumerate(products):
-        try:
-            id = int(product['id'])
-            if id <= 0:
-                return f"Invalid product id for request number {index}.", 400
-        except Exception:
-            return f"Invalid product id for request number {index}.", 400
-    for index, product in enumerate(products):
-        try:
-            quantity = int(product['quantity'])
-            if quantity <= 0:
-                return f"Invalid product quantity for request number {index}.", 400
-        except Exception:
-            return f"Invalid product quantity for request number {index}.", 400
+            if missing_id is None:
+                missing_id = index
+        elif invalid_id is None and not is_positive_integer(product['id']):
+            invalid_id = index
 
-    message, status = customerDatabaseService.check_products(products)
-    return message, status
+        if 'quantity' not in product:
+            if missing_quantity is None:
+                missing_quantity = index
+        elif invalid_quantity is None and not is_positive_integer(product['quantity']):
+            invalid_quantity = index
+
+    if missing_id is not None:
+        return f"Product id is missing for request number {missing_id}.", 400
+    if missing_quantity is not None:
+        return f"Product quantity is missing for request number {missing_quantity}.", 400
+    if invalid_id is not None:
+        return f"Invalid product id for request number {invalid_id}.", 400
+    if invalid_quantity is not None:
+        return f"Invalid product quantity for request number {invalid_quantity}.", 400
+
+    records, status = customerDatabaseService.check_products(products)
+    return records, status
 
 # endpoint receives product ids and quantities and makes order with them
 @app.route('/order', methods=['POST'])
+@require_role('customer')
 def order():
-    email, role, status = auth('customer')
-    if status != 200:
-        return jsonify({'msg': "Missing Authorization Header"}), status
+    email = g.claims.email
 
     # check for if request body is missing any information
     data = request.get_json()
@@ -92,9 +149,9 @@ def order():
         return jsonify({'message': "Field requests is missing."}), 400
 
     products = data['requests']
-    message, status = check_order_request(products)
+    records, status = check_order_request(products)
     if status != 200:
-        return jsonify({'message': message}), status
+        return jsonify({'message': records}), status
 
     if not 'address' in data:
         return jsonify({'message': "Field address is missing."}), 400
@@ -108,38 +165,80 @@ def order():
         return jsonify({'message': "Invalid address."}), 400
 
     # submit order to the databases
-    message, status = customerDatabaseService.make_order(products, email)
+    message, status = customerDatabaseService.make_order(products, email, records, address)
     if status != 200:
         return jsonify({'message': message}), status
 
     order_id = int(message)
 
+    # the contract is deployed in the background and its address is set once it is mined
+    if CONTRACT_DEPLOYMENT == "async":
+        deploymentWorker.submit(order_id)
+        return jsonify({'id': order_id}), 200
+
     # calculate total price
     total_price = customerDatabaseService.get_total_price(order_id)
-    # create and deploy smart contract with customers address and total price of the order
-    contract_address = ganacheClient.deploy_contract(address, total_price)
+    # create smart contract of the order with customers address and total price of the order
+    contract_address = ganacheClient.deploy_orders([(order_id, address, total_price)])[0]
     # set contract address in order
     customerDatabaseService.set_address(order_id, contract_address)
 
     return jsonify({'id': order_id}), 200
 
 # endpoint returns all orders of a customer based on his email
+# optional parameters after (id of the last order already received) and limit return one page of orders
+# optional parameter stream sends the orders as a chunked JSON response
 @app.route('/status', methods=['GET'])
+@require_role('customer')
 def status():
-    email, role, status = auth('customer')
-    if status != 200:
-        return jsonify({'msg': "Missing Authorization Header"}), status
+    email = g.claims.email
+
+    after = request.args.get('after')
+    if after is not None:
+        try:
+            after = int(after)
+            if after < 0:
+                return jsonify({"message": "Invalid cursor."}), 400
+        except ValueError:
+            return jsonify({"message": "Invalid cursor."}), 400
+
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+            if limit <= 0 or limit > MAX_ORDERS_PAGE:
+                return jsonify({"message": "Invalid limit."}), 400
+        except ValueError:
+            return jsonify({"message": "Invalid limit."}), 400
 
-    result = customerDatabaseService.get_orders(email)
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return Response(stream_with_context(stream_orders(email, after, limit)), mimetype='application/json')
+
+    result = customerDatabaseService.get_orders(email, after, limit)
     return jsonify(result), 200
 
+# function that yields JSON of the orders piece by piece while orders are loaded in batches
+# a page ends with the cursor of the next one, like the response without stream
+def stream_orders(email, after, limit):
+    yield '{"orders": ['
+    next_cursor = last_id = None
+    orders = customerDatabaseService.iter_orders(email, after, limit + 1 if limit else None)
+    for index, (order_id, order) in enumerate(orders):
+        if limit and index == limit:
+            next_cursor = last_id
+            break
+        yield (", " if index else "") + app.json.dumps(order)
+        last_id = order_id
+
+    if after is None and limit is None:
+        yield ']}'
+    else:
+        yield '], "next": ' + app.json.dumps(next_cursor) + '}'
+
 # endpoint marks order as delivered in the database and in the smart contract
 @app.route('/delivered', methods=['POST'])
+@require_role('customer')
 def delivered():
-    email, role, status = auth('customer')
-    if status != 200:
-        return jsonify({'msg': "Missing Authorization Header"}), status
-
     # check for any missing field in the request body
     data = request.get_json()
     if not data or 'id' not in data:
@@ -163,19 +262,18 @@ def delivered():
     if status != 200:
         return jsonify({'message': message}), status
 
-    # confirm delivery in the smart contract
-    contract_address, _ = customerDatabaseService.get_address(order_id)
-    ganacheClient.confirm_delivery(contract_address)
+    # confirm delivery in the smart contract, the payout has been written to the outbox with the status
+    if PAYOUTS == "sync":
+        payoutWorker.process([order_id])
+    else:
+        payoutWorker.submit()
 
     return jsonify({"message": message}), status
 
 # endpoint returns transaction that customer has to pays
 @app.route('/generate_invoice', methods=['POST'])
+@require_role('customer')
 def generate_invoice():
-    email, role, status = auth('customer')
-    if status != 200:
-        return jsonify({'msg': "Missing Authorization Header"}), status
-
     # check for any missing fields in the request body
     data = request.get_json()
     if not 'id' in data:
@@ -203,12 +301,33 @@ def generate_invoice():
 
     # get contract address
     contract_address, status = customerDatabaseService.get_address(order_id)
+    if contract_address == "":
+        # the contract of a new order may still be deploying in the background, a batch that is about to be mined is waited for briefly
+        deploymentWorker.wait(order_id, CONTRACT_WAIT_TIMEOUT)
+        contract_address, status = customerDatabaseService.reload_address(order_id)
+    if contract_address == "":
+        response = jsonify({'message': "Contract not deployed yet."})
+        response.headers['Retry-After'] = "1"
+        return response, 503
+    # payments seen by the indexer are answered without reading the contract
+    if customerDatabaseService.is_paid(order_id):
+        return jsonify({'message': "Transfer already complete."}), 400
     # generate invoice
-    status, message = ganacheClient.generate_invoice(contract_address, address)
+    status, message = ganacheClient.generate_invoice(contract_address, address, order_id)
     if not status:
         return jsonify({'message': message}), 400
 
     return jsonify({'invoice': message}), 200
 
+# endpoint returns counters of the service's caches, used for tuning their sizes and lifetimes
+@app.route('/metrics', methods=['GET'])
+@require_role('owner')
+def metrics():
+    return jsonify({
+        "address_cache": ganacheClient.address_cache.stats(),
+        "rpc": ganacheClient.rpc_metrics.stats(),
+        "auth": auth_metrics.stats(),
+    }), 200
+
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0", port=5002)
\ No newline at end of file
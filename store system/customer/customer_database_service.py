@@ -1,7 +1,9 @@
-from sqlalchemy import func
+from datetime import datetime, timedelta
+from sqlalchemy import func, update, insert, select, bindparam
+from search_index import SearchIndex
 
 class CustomerDatabaseService:
-    def __init__(self, db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory):
+    def __init__(self, db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales, ContractState, PayoutOutbox, PayoutStatus, search_check_interval=0.0):
         self.db = db
         self.Product = Product
         self.Category = Category
@@ -9,6 +11,12 @@ class CustomerDatabaseService:
         self.OrderProduct = OrderProduct
         self.OrderStatus = OrderStatus
         self.ProductCategory = ProductCategory
+        self.ProductSales = ProductSales
+        self.CategorySales = CategorySales
+        self.ContractState = ContractState
+        self.PayoutOutbox = PayoutOutbox
+        self.PayoutStatus = PayoutStatus
+        self.search_index = SearchIndex(db, Product, Category, ProductCategory, search_check_interval)
 
     # function that returns list of categories which names contain text given by parameter category
     # and list of products which names contain text given by the parameter name and are in given category
@@ -16,36 +24,30 @@ class CustomerDatabaseService:
         if name == "" and category == "":
             return []
 
-        # create queries for products
-        product_query = self.Product.query
-        if name:
-            product_query = product_query.filter(self.Product.name.ilike(f"%{name}%"))
-        if category:
-            product_query = product_query.join(self.Product.categories).filter(self.Category.name.ilike(f"%{category}%"))
+        # find matching ids in the search index
+        product_ids, categories = self.search_index.search(name, category)
 
-        # execute the query and parse the result
-        products = product_query.distinct().all()
-        products = [
-            {
-                "id": product.id,
-                "name": product.name,
-                "price": float(product.price),
-                "categories": [c.name for c in product.categories]
-            }
-            for product in products
-        ]
-
-        # create queries for categories
-        category_query = self.Category.query
-        if category:
-            category_query = category_query.filter(self.Category.name.ilike(f"%{category}%"))
-
-        if name:
-            category_query = category_query.join(self.Category.products).filter(self.Product.name.ilike(f"%{name}%"))
-
-        # execute query and parse the result
-        categories = category_query.distinct().all()
-        categories = [c.name for c in categories]
+        # load matching products together with their category names and parse the result
+        products = {}
+        for chunk in self.chunks(product_ids):
+            rows = (
+                self.db.session.query(self.Product.id, self.Product.name, self.Product.price, self.Category.name)
+                .outerjoin(self.ProductCategory, self.ProductCategory.product_id == self.Product.id)
+                .outerjoin(self.Category, self.Category.id == self.ProductCategory.category_id)
+                .filter(self.Product.id.in_(chunk))
+                .order_by(self.Product.id, self.Category.id)
+            )
+            for id, product_name, price, category_name in rows:
+                if id not in products:
+                    products[id] = {
+                        "id": id,
+                        "name": product_name,
+                        "price": float(price),
+                        "categories": []
+                    }
+                if category_name is not None:
+                    products[id]["categories"].append(category_name)
+        products = list(products.values())
 
         # format final result
         response = {
@@ -55,14 +57,24 @@ class CustomerDatabaseService:
 
         return response
 
+    # function that splits given values into lists suitable for IN (...) lookups
+    def chunks(self, values, size=1000):
+        for start in range(0, len(values), size):
+            yield values[start:start + size]
+
     # function that check whether some of the products given does not exit in the database
+    # all products are loaded with IN (...) queries and returned mapped by their ids
     def check_products(self, products):
+        ids = list({int(product['id']) for product in products})
+        records = {}
+        for chunk in self.chunks(ids):
+            records.update((record.id, record) for record in self.Product.query.filter(self.Product.id.in_(chunk)))
+
         for index, product in enumerate(products):
-            product_record = self.Product.query.filter_by(id=product['id']).first()
-            if not product_record:
+            if int(product['id']) not in records:
                 return f"Invalid product for request number {index}.", 400
 
-        return "", 200
+        return records, 200
 
     # function that checks whether order exists in the database based on its id
     def check_order(self, order_id):
@@ -72,19 +84,90 @@ class CustomerDatabaseService:
         return "", 200
 
     # function that creates order and inserts it in the database
-    def make_order(self, products, email):
-        order = self.Order(email=email, status=self.OrderStatus.CREATED, address="")
+    # records are the products returned by check_products, they are loaded again when not given
+    # customer_address is the account the contract of the order is deployed for
+    def make_order(self, products, email, records=None, customer_address=""):
+        if records is None:
+            records, _ = self.check_products(products)
 
+        order = self.Order(email=email, status=self.OrderStatus.CREATED, address="", customer_address=customer_address)
+
+        # total price is calculated from the loaded products and stored with the order
+        total_price = 0
         for index, product in enumerate(products):
-            product_record = self.Product.query.filter_by(id=product['id']).first()
-            order_product = self.OrderProduct(product=product_record, quantity=float(product['quantity']))
+            product_record = records[int(product['id'])]
+            order_product = self.OrderProduct(product_id=product_record.id, quantity=int(product['quantity']))
             order.products.append(order_product)
+            total_price += product_record.price * order_product.quantity
+
+        order.price = total_price
 
         self.db.session.add(order)
+        self.db.session.flush()
+
+        # ordered quantities are waiting for delivery
+        self.update_product_sales(order, waiting=1)
         self.db.session.commit()
 
         return order.id, 200
 
+    # function that adds quantities of the given order to the product sales counters
+    # sold and waiting are the signs (-1, 0 or 1) the quantities are added with
+    def update_product_sales(self, order, sold=0, waiting=0):
+        counters = self.ProductSales.__table__
+        statement = (
+            update(counters)
+            .where(counters.c.product_id == bindparam("id"))
+            .values(
+                sold=counters.c.sold + bindparam("sold"),
+                waiting=counters.c.waiting + bindparam("waiting")
+            )
+        )
+        rows = [
+            {"id": op.product_id, "sold": sold * op.quantity, "waiting": waiting * op.quantity}
+            for op in order.products
+        ]
+        self.update_counters(counters, "product_id", statement, rows)
+
+    # function that adds quantities of the given delivered order to the category sales counters
+    def update_category_sales(self, order_id):
+        deltas = (
+            self.db.session.query(self.ProductCategory.category_id, func.sum(self.OrderProduct.quantity))
+            .join(self.OrderProduct, self.OrderProduct.product_id == self.ProductCategory.product_id)
+            .filter(self.OrderProduct.order_id == order_id)
+            .group_by(self.ProductCategory.category_id)
+        )
+
+        counters = self.CategorySales.__table__
+        statement = (
+            update(counters)
+            .where(counters.c.category_id == bindparam("id"))
+            .values(delivered=counters.c.delivered + bindparam("delivered"))
+        )
+        rows = [{"id": category_id, "delivered": int(quantity)} for category_id, quantity in deltas.all()]
+        self.update_counters(counters, "category_id", statement, rows)
+
+    # function that executes the counter update statement for the given rows and creates the counters it did not find
+    # rows are updated in id order, so concurrent orders lock shared counters in the same order and do not deadlock
+    def update_counters(self, counters, key, statement, rows):
+        rows = sorted(rows, key=lambda row: row["id"])
+        if not rows:
+            return
+
+        result = self.db.session.execute(statement, rows)
+        if result.rowcount == len(rows):
+            return
+
+        # counters missing from the table start from the added quantities, as if they had been zero
+        ids = [row["id"] for row in rows]
+        existing = set(self.db.session.scalars(select(counters.c[key]).where(counters.c[key].in_(ids))))
+        missing = [
+            {key: row["id"], **{name: value for name, value in row.items() if name != "id"}}
+            for row in rows if row["id"] not in existing
+        ]
+        if missing:
+            self.db.session.execute(insert(counters), missing)
+
     # function that sets smart contract address in the given order
     def set_address(self, order_id, address):
         order = self.Order.query.filter_by(id=order_id).first()
@@ -93,6 +176,16 @@ class CustomerDatabaseService:
         self.db.session.flush()
         self.db.session.commit()
 
+    # function that returns (id, customer address, price) of orders whose contract is not deployed yet
+    # when order ids are given only those orders are returned
+    def get_undeployed_orders(self, order_ids=None):
+        query = self.db.session.query(self.Order.id, self.Order.customer_address, self.Order.price).filter(
+            self.Order.address == "", self.Order.customer_address != ""
+        )
+        if order_ids is not None:
+            query = query.filter(self.Order.id.in_(order_ids))
+        return query.order_by(self.Order.id).all()
+
     # function that returns smart contract address for the given order
     def get_address(self, order_id):
         order = self.Order.query.filter_by(id=order_id).first()
@@ -100,58 +193,113 @@ class CustomerDatabaseService:
             return "Invalid order id.", 400
         return order.address, 200
 
-    # function that calculates total price for a given order
+    # function that checks whether the indexer has seen the payment of the given order
+    # False also means the indexer may not have reached the payment yet
+    def is_paid(self, order_id):
+        paid = self.db.session.query(self.ContractState.paid).filter(self.ContractState.order_id == order_id).scalar()
+        return bool(paid)
+
+    # function that returns smart contract address for the given order as currently committed
+    # the transaction of the session is ended first, so an address set by another thread is seen
+    def reload_address(self, order_id):
+        self.db.session.rollback()
+        return self.get_address(order_id)
+
+    # function that returns total price of a given order
+    # price is calculated when the order is made, so only the order row is read
     def get_total_price(self, order_id):
-        result = (
+        price = self.db.session.query(self.Order.price).filter(self.Order.id == order_id).scalar()
+        return price if price is not None else 0
+
+    # function that returns all orders for a customer based on his email
+    # when after or limit are given, only limit orders with ids greater than after are returned
+    # together with the cursor of the next page
+    def get_orders(self, email, after=None, limit=None):
+        if after is None and limit is None:
+            return {"orders": [order for _, order in self.iter_orders(email)]}
+
+        orders = list(self.iter_orders(email, after, limit + 1 if limit else None))
+        next_cursor = None
+        if limit and len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = orders[-1][0]
+
+        return {"orders": [order for _, order in orders], "next": next_cursor}
+
+    # function that yields (order id, order data) for orders of a customer in order of their ids
+    # orders are loaded in batches of batch_size using the last order id as the cursor
+    def iter_orders(self, email, after=None, limit=None, batch_size=500):
+        cursor = after or 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            count = batch_size if remaining is None else min(batch_size, remaining)
+            orders = self.load_orders(email, cursor, count)
+            yield from orders
+
+            if len(orders) < count:
+                return
+            cursor = orders[-1][0]
+            if remaining is not None:
+                remaining -= len(orders)
+
+    # function that loads at most count orders of a customer with ids greater than after
+    # orders, ordered products and their categories are loaded with three set-based queries
+    def load_orders(self, email, after, count):
+        # orders with their stored total price
+        orders = (
+            self.db.session.query(self.Order.id, self.Order.status, self.Order.timestamp, self.Order.price)
+            .filter(self.Order.email == email, self.Order.id > after)
+            .order_by(self.Order.id)
+            .limit(count)
+            .all()
+        )
+        if not orders:
+            return []
+
+        order_ids = [order_id for order_id, _, _, _ in orders]
+
+        # products of every order
+        order_products = (
             self.db.session.query(
-                self.Order.id,
-                func.sum(self.OrderProduct.quantity * self.Product.price).label('price')
+                self.OrderProduct.order_id, self.Product.id, self.Product.name, self.Product.price, self.OrderProduct.quantity
             )
-            .join(self.OrderProduct, self.OrderProduct.order_id == self.Order.id)
             .join(self.Product, self.Product.id == self.OrderProduct.product_id)
-            .group_by(self.Order.id)
-            .first()
+            .filter(self.OrderProduct.order_id.in_(order_ids))
+            .order_by(self.OrderProduct.order_id, self.OrderProduct.product_id)
+            .all()
         )
 
-        if result:
-            _, total_price = result
-            return total_price
-        return 0
-
-    # function that returns all orders for a customer based on his email
-    def get_orders(self, email):
-        # create query
-        orders = self.db.session.query(self.Order).filter(self.Order.email == email).all()
-
-        result = {"orders": []}
-
-        for order in orders:
-            # initialize empty order data
-            order_data = {
-                "products": [],
-                "price": 0.0,
-                "status": order.status.value,
-                "timestamp": order.timestamp.strftime("%Y-%m-%dT%H:%M:%SZ"),
-            }
-
-            # fill order data with products and calculate the total prices
-            total_price = 0.0
-            for op in order.products:
-                product = op.product
-                product_data = {
-                    "categories": [c.name for c in product.categories],
-                    "name": product.name,
-                    "price": float(product.price),
-                    "quantity": op.quantity,
-                }
+        # categories of every ordered product
+        product_ids = {product_id for _, product_id, _, _, _ in order_products}
+        product_categories = (
+            self.db.session.query(self.ProductCategory.product_id, self.Category.name)
+            .join(self.Category, self.Category.id == self.ProductCategory.category_id)
+            .filter(self.ProductCategory.product_id.in_(product_ids))
+            .order_by(self.ProductCategory.product_id, self.ProductCategory.category_id)
+        )
 
-                total_price += float(product.price) * op.quantity
-                order_data["products"].append(product_data)
+        categories = {}
+        for product_id, name in product_categories:
+            categories.setdefault(product_id, []).append(name)
 
-            order_data["price"] = round(total_price, 2)
-            result["orders"].append(order_data)
+        products = {}
+        for order_id, product_id, name, price, quantity in order_products:
+            products.setdefault(order_id, []).append({
+                "categories": categories.get(product_id, []),
+                "name": name,
+                "price": float(price),
+                "quantity": quantity,
+            })
 
-        return result
+        return [
+            (order_id, {
+                "products": products.get(order_id, []),
+                "price": round(float(price), 2),
+                "status": status.value,
+                "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            })
+            for order_id, status, timestamp, price in orders
+        ]
 
     # function that confirms delivery for a given order in the  database
     def confirm_delivery(self, order_id):
@@ -160,6 +308,51 @@ class CustomerDatabaseService:
             return "Delivery not complete.", 400
 
         order.status = self.OrderStatus.COMPLETE
+        # delivered quantities move from waiting to sold
+        self.update_product_sales(order, sold=1, waiting=-1)
+        self.update_category_sales(order_id)
+        # the payout is confirmed in the smart contract by the payout worker
+        self.db.session.add(self.PayoutOutbox(order_id=order_id, contract_address=order.address))
         self.db.session.commit()
 
-        return "", 200
\ No newline at end of file
+        return "", 200
+
+    # function that returns (order id, contract address, failed attempts) of payouts due for an attempt, oldest first
+    # when order ids are given only those payouts are returned
+    def get_due_payouts(self, limit, order_ids=None):
+        query = self.db.session.query(
+            self.PayoutOutbox.order_id, self.PayoutOutbox.contract_address, self.PayoutOutbox.attempts
+        ).filter(
+            self.PayoutOutbox.status == self.PayoutStatus.PENDING,
+            self.PayoutOutbox.next_attempt <= datetime.utcnow()
+        )
+        if order_ids is not None:
+            query = query.filter(self.PayoutOutbox.order_id.in_(order_ids))
+        return query.order_by(self.PayoutOutbox.next_attempt).limit(limit).all()
+
+    # function that stores the hash of the transaction sent for the payout
+    def set_payout_transaction(self, order_id, transaction_hash):
+        self.db.session.query(self.PayoutOutbox).filter(self.PayoutOutbox.order_id == order_id).update(
+            {"transaction_hash": transaction_hash}
+        )
+        self.db.session.commit()
+
+    # function that marks the given payouts as confirmed in their smart contracts
+    def finish_payouts(self, order_ids):
+        if not order_ids:
+            return
+        self.db.session.query(self.PayoutOutbox).filter(self.PayoutOutbox.order_id.in_(order_ids)).update(
+            {"status": self.PayoutStatus.DONE, "last_error": None}
+        )
+        self.db.session.commit()
+
+    # function that records a failed attempt and schedules the payout to be attempted again after delay seconds
+    def retry_payout(self, order_id, error, delay):
+        self.db.session.query(self.PayoutOutbox).filter(self.PayoutOutbox.order_id == order_id).update(
+            {
+                "attempts": self.PayoutOutbox.attempts + 1,
+                "next_attempt": datetime.utcnow() + timedelta(seconds=delay),
+                "last_error": str(error)[:512],
+            }
+        )
+        self.db.session.commit()
\ No newline at end of file
@@ -0,0 +1,96 @@
+import queue
+import threading
+import time
+
+
+# background worker that deploys smart contracts of new orders
+# orders are committed without a contract address and the worker sets it once the deployment is mined
+class DeploymentWorker:
+
+    def __init__(self, app, customerDatabaseService, ganacheClient, batch_size=20, retry_interval=30):
+        self.app = app
+        self.customerDatabaseService = customerDatabaseService
+        self.ganacheClient = ganacheClient
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+
+        self.queue = queue.Queue()
+        self.queued = {}  # events of orders waiting in the queue or being deployed, set once the attempt ends
+        self.lock = threading.Lock()
+        self.thread = None
+
+    # function that starts the worker thread once
+    # orders left undeployed by a previous run are deployed first
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name="contract-deployment", daemon=True)
+            self.thread.start()
+
+    # function that schedules deployment of the contract for the given order
+    def submit(self, order_id):
+        self.start()
+        with self.lock:
+            if order_id in self.queued:
+                return
+            self.queued[order_id] = threading.Event()
+        self.queue.put(order_id)
+
+    # function that waits until the deployment of the given order has been attempted, at most timeout seconds
+    # returns immediately when the order is not waiting for deployment in this process
+    def wait(self, order_id, timeout):
+        with self.lock:
+            event = self.queued.get(order_id)
+        if event is not None:
+            event.wait(timeout)
+
+    # function that schedules every order that still has no contract
+    def submit_undeployed(self):
+        with self.app.app_context():
+            orders = self.customerDatabaseService.get_undeployed_orders()
+        for order_id, _, _ in orders:
+            self.submit(order_id)
+
+    def run(self):
+        last_sweep = 0
+        while True:
+            if time.monotonic() - last_sweep > self.retry_interval:
+                try:
+                    self.submit_undeployed()
+                except Exception as e:
+                    print(f"Failed to load undeployed orders: {e}")
+                last_sweep = time.monotonic()
+
+            # wait for an order and take whatever else is waiting, up to the batch size
+            try:
+                batch = [self.queue.get(timeout=self.retry_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self.deploy(batch)
+            except Exception as e:
+                # orders stay undeployed and are picked up by the next sweep
+                print(f"Failed to deploy contracts for orders {batch}: {e}")
+            finally:
+                with self.lock:
+                    for order_id in batch:
+                        self.queued.pop(order_id).set()
+
+    # function that deploys contracts for the given orders and stores their addresses
+    def deploy(self, order_ids):
+        with self.app.app_context():
+            orders = self.customerDatabaseService.get_undeployed_orders(order_ids)
+            if not orders:
+                return
+
+            addresses = self.ganacheClient.deploy_orders(orders)
+            for (order_id, _, _), address in zip(orders, addresses):
+                if address:
+                    self.customerDatabaseService.set_address(order_id, address)
@@ -0,0 +1,197 @@
+import threading
+from sqlalchemy import create_engine, MetaData, Table, Column, String, BigInteger, select, update, insert, delete
+from sqlalchemy.exc import IntegrityError
+
+metadata = MetaData()
+
+# next free nonce of every account that signs transactions
+nonces = Table(
+    'Nonce', metadata,
+    Column('address', String(42), primary_key=True),
+    Column('next_nonce', BigInteger, nullable=False),
+)
+
+# nonces below the next free one whose transaction was never sent, they are handed out again before new ones
+gaps = Table(
+    'NonceGap', metadata,
+    Column('address', String(42), primary_key=True),
+    Column('nonce', BigInteger, primary_key=True),
+)
+
+
+# allocator of transaction nonces for one account
+# with a database every process and container using it shares the counter, otherwise it is kept in memory
+# the chain mines transactions of an account in nonce order, so a nonce that was handed out and never sent
+# holds back every later transaction until it is used, such nonces are released and reused by the next allocation
+class NonceManager:
+
+    def __init__(self, w3, address, database_uri=None):
+        self.w3 = w3
+        self.address = address
+
+        self.lock = threading.Lock()
+        self.next_nonce = None
+        self.gaps = set()
+
+        self.engine = None
+        if database_uri:
+            self.engine = create_engine(database_uri, pool_pre_ping=True)
+            metadata.create_all(self.engine)
+
+    # function that returns number of transactions of the account known to the chain, including pending ones
+    def chain_nonce(self):
+        return self.w3.eth.get_transaction_count(self.address, "pending")
+
+    # function that returns number of mined transactions of the account, nonces below it are used for good
+    def mined_nonce(self):
+        return self.w3.eth.get_transaction_count(self.address, "latest")
+
+    # function that reserves count consecutive nonces and returns the first one
+    # a single nonce is taken from the released ones first
+    def allocate(self, count=1):
+        if count == 1:
+            nonce = self.claim_gap()
+            if nonce is not None:
+                return nonce
+
+        if self.engine is None:
+            with self.lock:
+                if self.next_nonce is None:
+                    self.next_nonce = self.chain_nonce()
+                nonce = self.next_nonce
+                self.next_nonce += count
+                return nonce
+
+        while True:
+            try:
+                with self.engine.begin() as connection:
+                    # the update locks the row until the transaction ends, so concurrent allocations queue up
+                    result = connection.execute(
+                        update(nonces)
+                        .where(nonces.c.address == self.address)
+                        .values(next_nonce=nonces.c.next_nonce + count)
+                    )
+                    if result.rowcount:
+                        next_nonce = connection.execute(
+                            select(nonces.c.next_nonce).where(nonces.c.address == self.address)
+                        ).scalar_one()
+                        return next_nonce - count
+
+                    # first allocation for the account starts from the chain
+                    nonce = self.chain_nonce()
+                    connection.execute(insert(nonces).values(address=self.address, next_nonce=nonce + count))
+                    return nonce
+            except IntegrityError:
+                # another process created the row first, allocate from it
+                continue
+
+    # function that returns the lowest released nonce that is still unused and removes it, or None
+    def claim_gap(self):
+        if self.engine is None:
+            with self.lock:
+                if not self.gaps:
+                    return None
+                mined = self.mined_nonce()
+                self.gaps = {nonce for nonce in self.gaps if nonce >= mined}
+                if not self.gaps:
+                    return None
+                nonce = min(self.gaps)
+                self.gaps.remove(nonce)
+                return nonce
+
+        with self.engine.connect() as connection:
+            released = connection.execute(
+                select(gaps.c.nonce).where(gaps.c.address == self.address).order_by(gaps.c.nonce)
+            ).scalars().all()
+        if not released:
+            return None
+
+        # released nonces that were mined meanwhile are dropped, the first one deleted by this process is its own
+        mined = self.mined_nonce()
+        for nonce in released:
+            with self.engine.begin() as connection:
+                claimed = connection.execute(
+                    delete(gaps).where(gaps.c.address == self.address, gaps.c.nonce == nonce)
+                ).rowcount
+            if claimed and nonce >= mined:
+                return nonce
+        return None
+
+    # function that gives back a nonce whose transaction was not sent
+    # the last nonce handed out is taken back by the counter, others are kept to be handed out again
+    def release(self, nonce):
+        if self.engine is None:
+            with self.lock:
+                if self.next_nonce == nonce + 1:
+                    self.next_nonce = nonce
+                else:
+                    self.gaps.add(nonce)
+            return
+
+        try:
+            with self.engine.begin() as connection:
+                taken_back = connection.execute(
+                    update(nonces)
+                    .where(nonces.c.address == self.address, nonces.c.next_nonce == nonce + 1)
+                    .values(next_nonce=nonce)
+                ).rowcount
+                if not taken_back:
+                    connection.execute(insert(gaps).values(address=self.address, nonce=nonce))
+        except IntegrityError:
+            # already released
+            pass
+
+    # function that sends a transaction with a nonce and returns what send returns
+    # send receives the nonce, a send that fails is retried with another nonce up to retries times
+    # nonces of sends that failed for another reason than their nonce were not used, so they are released,
+    # when every attempt fails, fill is called with each released nonce, so no later transaction waits behind it
+    def submit(self, send, retries=3, fill=None):
+        for attempt in range(retries):
+            nonce = self.allocate()
+            try:
+                return send(nonce)
+            except Exception as e:
+                nonce_error = "nonce" in str(e).lower()
+                if not nonce_error:
+                    self.release(nonce)
+                # skip nonces the chain has already seen
+                self.resync()
+                if not nonce_error or attempt == retries - 1:
+                    if fill is not None:
+                        try:
+                            self.fill_gaps(fill)
+                        except Exception:
+                            # nonces left released are reused by the next allocation
+                            pass
+                    raise
+
+    # function that uses every released nonce with fill, stops at the first one that can not be sent
+    def fill_gaps(self, fill):
+        while True:
+            nonce = self.claim_gap()
+            if nonce is None:
+                return
+            try:
+                fill(nonce)
+            except Exception as e:
+                if "nonce" not in str(e).lower():
+                    self.release(nonce)
+                return
+
+    # function that moves the next nonce up to the one expected by the chain
+    # called after a failed submission, the counter only moves forward, so nonces handed out to others are never reused
+    def resync(self):
+        nonce = self.chain_nonce()
+        if self.engine is None:
+            with self.lock:
+                if self.next_nonce is not None:
+                    self.next_nonce = max(self.next_nonce, nonce)
+            return
+
+        # without a row the next allocation starts from the chain anyway
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(nonces)
+                .where(nonces.c.address == self.address, nonces.c.next_nonce < nonce)
+                .values(next_nonce=nonce)
+            )
@@ -53,7 +53,9 @@ class Order(db.Model):
     email = db.Column(db.String(256), nullable=False)
     status = db.Column(db.Enum(OrderStatus), nullable=False, default=OrderStatus.CREATED)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    address = db.Column(db.String(256), nullable=False)
+    address = db.Column(db.String(256), nullable=False, index=True)
+    price = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    customer_address = db.Column(db.String(256), nullable=False, default="")
 
     products = db.relationship('OrderProduct', back_populates='order', cascade="all, delete-orphan", lazy='select')
 
@@ -73,3 +75,74 @@ class OrderProduct(db.Model):
 
     def __repr__(self):
         return f"<OrderProduct(order_id={self.order_id}, product_id={self.product_id}, quantity={self.quantity})>"
+
+
+class ProductSales(db.Model):
+    __tablename__ = 'ProductSales'
+
+    # quantities of the product in completed orders and in orders that are not delivered yet
+    product_id = db.Column(db.Integer, db.ForeignKey('Product.id', ondelete='CASCADE'), primary_key=True)
+    sold = db.Column(db.Integer, nullable=False, default=0)
+    waiting = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ProductSales(product_id={self.product_id}, sold={self.sold}, waiting={self.waiting})>"
+
+
+class CategorySales(db.Model):
+    __tablename__ = 'CategorySales'
+
+    # quantity of products from the category in completed orders
+    category_id = db.Column(db.Integer, db.ForeignKey('Category.id', ondelete='CASCADE'), primary_key=True)
+    delivered = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CategorySales(category_id={self.category_id}, delivered={self.delivered})>"
+
+
+class ContractState(db.Model):
+    __tablename__ = 'ContractState'
+
+    # state of the smart contract of the order, mirrored from contract events by the indexer
+    order_id = db.Column(db.Integer, db.ForeignKey('Order.id', ondelete='CASCADE'), primary_key=True)
+    contract_address = db.Column(db.String(42), nullable=False)
+    paid = db.Column(db.Boolean, nullable=False, default=False)
+    courier_bound = db.Column(db.Boolean, nullable=False, default=False)
+    courier = db.Column(db.String(42), nullable=True)
+    delivered = db.Column(db.Boolean, nullable=False, default=False)
+    block_number = db.Column(db.BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<ContractState(order_id={self.order_id}, paid={self.paid}, courier_bound={self.courier_bound}, delivered={self.delivered})>"
+
+
+class PayoutStatus(Enum):
+    PENDING = "PENDING"
+    DONE = "DONE"
+
+
+class PayoutOutbox(db.Model):
+    __tablename__ = 'PayoutOutbox'
+
+    # payout of a delivered order, written with the status change and confirmed in the smart contract by a worker
+    order_id = db.Column(db.Integer, db.ForeignKey('Order.id', ondelete='CASCADE'), primary_key=True)
+    contract_address = db.Column(db.String(256), nullable=False)
+    status = db.Column(db.Enum(PayoutStatus), nullable=False, default=PayoutStatus.PENDING)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    transaction_hash = db.Column(db.String(66), nullable=True)
+    last_error = db.Column(db.String(512), nullable=True)
+
+    def __repr__(self):
+        return f"<PayoutOutbox(order_id={self.order_id}, status='{self.status.name}', attempts={self.attempts})>"
+
+
+class IndexerCheckpoint(db.Model):
+    __tablename__ = 'IndexerCheckpoint'
+
+    # last block whose events are in the database
+    name = db.Column(db.String(64), primary_key=True)
+    block_number = db.Column(db.BigInteger, nullable=False)
+
+    def __repr__(self):
+        return f"<IndexerCheckpoint(name='{self.name}', block_number={self.block_number})>"
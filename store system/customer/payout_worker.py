@@ -0,0 +1,116 @@
+import threading
+
+
+# background worker that confirms deliveries in smart contracts, which pays the owner and the courier
+# payouts are read from the outbox written together with the order status, so none is lost when a call fails
+class PayoutWorker:
+
+    def __init__(self, app, customerDatabaseService, ganacheClient, batch_size=20, retry_interval=5, max_delay=300):
+        self.app = app
+        self.customerDatabaseService = customerDatabaseService
+        self.ganacheClient = ganacheClient
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.max_delay = max_delay
+
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.in_flight = {}  # order id -> event set once its payout has been processed, each by one caller at a time
+        self.thread = None
+        self.thread_lock = threading.Lock()
+
+    # function that starts the worker thread once
+    # payouts left pending by a previous run are processed first
+    def start(self):
+        with self.thread_lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name="payouts", daemon=True)
+            self.thread.start()
+
+    # function that wakes the worker up for new payouts
+    def submit(self):
+        self.start()
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            try:
+                while self.process() == self.batch_size:
+                    pass
+            except Exception as e:
+                # payouts stay pending and are attempted again with the next round
+                print(f"Failed to process payouts: {e}")
+
+            self.wakeup.wait(self.retry_interval)
+            self.wakeup.clear()
+
+    # function that processes due payouts, only the given ones when order ids are set
+    # payouts already being processed by another caller are not processed again,
+    # when order ids are set they are waited for, so the given payouts are done when it returns
+    # returns the number of payouts processed
+    def process(self, order_ids=None):
+        with self.app.app_context():
+            due = self.customerDatabaseService.get_due_payouts(self.batch_size, order_ids)
+            with self.lock:
+                payouts = [payout for payout in due if payout[0] not in self.in_flight]
+                running = [self.in_flight[order_id] for order_id, _, _ in due if order_id in self.in_flight]
+                for order_id, _, _ in payouts:
+                    self.in_flight[order_id] = threading.Event()
+            try:
+                self.pay(payouts)
+            finally:
+                with self.lock:
+                    for order_id, _, _ in payouts:
+                        self.in_flight.pop(order_id).set()
+
+            if order_ids is not None:
+                for event in running:
+                    event.wait()
+            return len(payouts)
+
+    # function that confirms deliveries of the given payouts and waits for their transactions
+    def pay(self, payouts):
+        if not payouts:
+            return
+
+        # payouts whose delivery is already confirmed, e.g. when the worker stopped after sending it, are only marked
+        statuses = self.ganacheClient.get_contract_statuses(
+            [(contract_address, order_id) for order_id, contract_address, _ in payouts]
+        )
+        confirmed = [
+            order_id for (order_id, _, _), status in zip(payouts, statuses)
+            if status is not None and status[5]
+        ]
+        self.customerDatabaseService.finish_payouts(confirmed)
+
+        # send every remaining confirmation before waiting for any of them
+        sent = []
+        for order_id, contract_address, attempts in payouts:
+            if order_id in confirmed:
+                continue
+            try:
+                transaction_hash = self.ganacheClient.send_confirm_delivery(contract_address, order_id)
+            except Exception as e:
+                self.retry(order_id, attempts, e)
+                continue
+            self.customerDatabaseService.set_payout_transaction(order_id, self.ganacheClient.w3.to_hex(transaction_hash))
+            sent.append((order_id, attempts, self.ganacheClient.receipts.track(transaction_hash)))
+
+        finished = []
+        for order_id, attempts, future in sent:
+            try:
+                receipt = future.result()
+            except Exception as e:
+                self.retry(order_id, attempts, e)
+                continue
+            if receipt.status == 1:
+                finished.append(order_id)
+            else:
+                self.retry(order_id, attempts, "Transaction reverted.")
+        self.customerDatabaseService.finish_payouts(finished)
+
+    # function that schedules a failed payout again, waiting twice as long after every failure
+    def retry(self, order_id, attempts, error):
+        delay = min(self.max_delay, self.retry_interval * 2 ** attempts)
+        self.customerDatabaseService.retry_payout(order_id, error, delay)
@@ -0,0 +1,114 @@
+import threading
+import time
+from concurrent.futures import Future
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TimeExhausted
+
+
+# tracker of sent transactions, a single thread polls the receipts of every pending transaction
+# callers get a future that is resolved with the receipt once the transaction is mined
+class ReceiptTracker:
+
+    def __init__(self, w3, poll_interval=0.1, timeout=120, batch_size=200):
+        self.w3 = w3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.batch_size = batch_size
+
+        self.condition = threading.Condition()
+        self.pending = {}  # transaction hash -> (future, deadline)
+        self.added = False  # indicates whether transactions were added since the last poll
+        self.thread = None
+
+    # function that returns the future of the receipt of the given transaction
+    def track(self, transaction_hash):
+        transaction_hash = Web3.to_hex(HexBytes(transaction_hash))
+        with self.condition:
+            # the thread is started with the first transaction, so processes that never send one do not run it
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="receipt-tracker", daemon=True)
+                self.thread.start()
+
+            if transaction_hash in self.pending:
+                return self.pending[transaction_hash][0]
+
+            future = Future()
+            self.pending[transaction_hash] = (future, time.monotonic() + self.timeout)
+            self.added = True
+            self.condition.notify()
+            return future
+
+    # function that waits for the receipt of the given transaction and returns it
+    def wait(self, transaction_hash):
+        return self.track(transaction_hash).result()
+
+    def run(self):
+        last_block = None
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                added, self.added = self.added, False
+                pending = dict(self.pending)
+
+            try:
+                # receipts can only appear with a new block, unless new transactions have been added
+                block = self.w3.eth.block_number
+                if added or block != last_block:
+                    # the block counts as polled only once its receipts were read, so a failed poll is repeated
+                    last_block = None
+                    self.resolve(pending)
+                    last_block = block
+            except Exception as e:
+                print(f"Failed to poll transaction receipts: {e}")
+
+            self.expire()
+            time.sleep(self.poll_interval)
+
+    # function that polls receipts of the given transactions and resolves futures of the mined ones
+    def resolve(self, pending):
+        hashes = list(pending)
+        mined = []
+        for start in range(0, len(hashes), self.batch_size):
+            batch = hashes[start:start + self.batch_size]
+            # pending transactions have no receipt, so raw responses are read to tell them apart
+            responses = self.w3.provider.make_batch_request(
+                [("eth_getTransactionReceipt", [transaction_hash]) for transaction_hash in batch]
+            )
+            if not isinstance(responses, list):
+                raise ValueError(f"Invalid response to a batch request: {responses}")
+            mined.extend(
+                transaction_hash for transaction_hash, response in zip(batch, responses)
+                if response.get("result") is not None
+            )
+
+        for start in range(0, len(mined), self.batch_size):
+            batch = mined[start:start + self.batch_size]
+            # every transaction of the batch is mined, so their receipts are read and formatted together
+            with self.w3.batch_requests() as requests:
+                for transaction_hash in batch:
+                    requests.add(self.w3.eth.get_transaction_receipt(transaction_hash))
+                receipts = requests.execute()
+
+            with self.condition:
+                for transaction_hash, receipt in zip(batch, receipts):
+                    self.pending.pop(transaction_hash, None)
+            for transaction_hash, receipt in zip(batch, receipts):
+                pending[transaction_hash][0].set_result(receipt)
+
+    # function that fails futures of transactions that were not mined in time
+    def expire(self):
+        now = time.monotonic()
+        with self.condition:
+            expired = [
+                (transaction_hash, future) for transaction_hash, (future, deadline) in self.pending.items()
+                if deadline <= now
+            ]
+            for transaction_hash, _ in expired:
+                del self.pending[transaction_hash]
+
+        for transaction_hash, future in expired:
+            future.set_exception(TimeExhausted(
+                f"Transaction {transaction_hash} is not in the chain after {self.timeout} seconds"
+            ))
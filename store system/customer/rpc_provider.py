@@ -0,0 +1,124 @@
+import threading
+import time
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+from web3 import HTTPProvider
+from web3.providers.rpc.utils import ExceptionRetryConfiguration
+
+# methods that only read the chain, so sending them again after a failure has no side effects
+READ_METHODS = [
+    "net_version",
+    "eth_chainId",
+    "eth_accounts",
+    "eth_blockNumber",
+    "eth_gasPrice",
+    "eth_getBalance",
+    "eth_getCode",
+    "eth_getTransactionCount",
+    "eth_getTransactionByHash",
+    "eth_getTransactionReceipt",
+    "eth_getBlockByNumber",
+    "eth_getBlockByHash",
+    "eth_getLogs",
+    "eth_call",
+    "eth_estimateGas",
+]
+
+# sessions by endpoint, shared by every provider and thread of the process
+sessions = {}
+sessions_lock = threading.Lock()
+
+
+# function that returns the pooled session of the endpoint
+def shared_session(endpoint_uri, pool_size):
+    with sessions_lock:
+        session = sessions.get(endpoint_uri)
+        if session is None:
+            session = Session()
+            # keep up to pool_size connections alive, so requests do not pay for new TCP connections
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            sessions[endpoint_uri] = session
+        return session
+
+
+# latency histograms of RPC calls by method
+class RPCMetrics:
+
+    # upper bounds of the buckets in seconds
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = {}
+
+    def observe(self, method, seconds, failed):
+        with self.lock:
+            histogram = self.methods.get(method)
+            if histogram is None:
+                histogram = {"count": 0, "errors": 0, "seconds": 0.0, "buckets": [0] * (len(self.BUCKETS) + 1)}
+                self.methods[method] = histogram
+
+            histogram["count"] += 1
+            histogram["errors"] += 1 if failed else 0
+            histogram["seconds"] += seconds
+
+            bucket = 0
+            while bucket < len(self.BUCKETS) and seconds > self.BUCKETS[bucket]:
+                bucket += 1
+            histogram["buckets"][bucket] += 1
+
+    # function that returns the histograms, every bucket counts the calls that took at most its bound
+    def stats(self):
+        bounds = [str(bound) for bound in self.BUCKETS] + ["+Inf"]
+        with self.lock:
+            return {
+                method: {
+                    "count": histogram["count"],
+                    "errors": histogram["errors"],
+                    "seconds": round(histogram["seconds"], 6),
+                    "buckets": dict(zip(bounds, histogram["buckets"])),
+                }
+                for method, histogram in self.methods.items()
+            }
+
+
+# HTTP provider using the shared session of its endpoint
+# requests time out, read methods are retried with exponential backoff and every call is measured
+class PooledHTTPProvider(HTTPProvider):
+
+    def __init__(self, endpoint_uri, pool_size=20, connect_timeout=3.0, read_timeout=30.0, retries=3, backoff_factor=0.1, metrics=None):
+        super().__init__(
+            endpoint_uri,
+            request_kwargs={"timeout": (connect_timeout, read_timeout)},
+            session=shared_session(endpoint_uri, pool_size),
+            exception_retry_configuration=ExceptionRetryConfiguration(
+                errors=(ConnectionError, HTTPError, Timeout),
+                retries=retries + 1,  # the first attempt is counted as well
+                backoff_factor=backoff_factor,
+                method_allowlist=READ_METHODS,
+            ),
+        )
+        self.metrics = metrics if metrics is not None else RPCMetrics()
+
+    def make_request(self, method, params):
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = super().make_request(method, params)
+            failed = "error" in response
+            return response
+        finally:
+            self.metrics.observe(method, time.perf_counter() - start, failed)
+
+    def make_batch_request(self, requests):
+        start = time.perf_counter()
+        failed = True
+        try:
+            response = super().make_batch_request(requests)
+            failed = not isinstance(response, list)
+            return response
+        finally:
+            self.metrics.observe("batch", time.perf_counter() - start, failed)
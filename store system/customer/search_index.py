@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import defaultdict
+from flask import current_app
+from sqlalchemy import func, select
+
+
+# trigram index over product and category names as of some point in time
+class IndexSnapshot:
+
+    GRAM_SIZE = 3
+
+    def __init__(self):
+        self.product_keys = {}  # product id -> lowercased name
+        self.category_keys = {}  # category id -> lowercased name
+        self.category_names = {}  # category id -> name
+        self.product_grams = defaultdict(set)  # trigram -> product ids
+        self.category_grams = defaultdict(set)  # trigram -> category ids
+        self.product_categories = defaultdict(set)  # product id -> category ids
+        self.category_products = defaultdict(set)  # category id -> product ids
+        self.last_product_id = 0
+        self.last_category_id = 0
+
+    # function that returns all trigrams of the given text
+    def grams(self, text):
+        return {text[i:i + self.GRAM_SIZE] for i in range(len(text) - self.GRAM_SIZE + 1)}
+
+    def add_categories(self, categories):
+        for id, name in categories:
+            key = name.lower()
+            self.category_keys[id] = key
+            self.category_names[id] = name
+            for gram in self.grams(key):
+                self.category_grams[gram].add(id)
+            self.last_category_id = max(self.last_category_id, id)
+
+    def add_products(self, products, links):
+        for id, name in products:
+            key = name.lower()
+            self.product_keys[id] = key
+            for gram in self.grams(key):
+                self.product_grams[gram].add(id)
+            self.last_product_id = max(self.last_product_id, id)
+
+        for product_id, category_id in links:
+            self.product_categories[product_id].add(category_id)
+            self.category_products[category_id].add(product_id)
+
+    # function that returns ids from keys whose name contains the given text
+    def match(self, keys, grams, text):
+        text = text.lower()
+        candidates = keys
+        text_grams = self.grams(text)
+        if text_grams:
+            # start from the rarest trigram and intersect with the rest
+            postings = sorted((grams.get(gram, set()) for gram in text_grams), key=len)
+            candidates = set.intersection(*postings)
+
+        return {id for id in candidates if text in keys[id]}
+
+
+# in-process trigram index over product and category names
+# answers case-insensitive "name contains text" lookups without scanning every name
+class SearchIndex:
+
+    def __init__(self, db, Product, Category, ProductCategory, check_interval=0.0):
+        self.db = db
+        self.Product = Product
+        self.Category = Category
+        self.ProductCategory = ProductCategory
+
+        # the tables are probed for changes at most every check_interval seconds
+        self.check_interval = check_interval
+        self.checked_at = None
+
+        self.lock = threading.Lock()  # held while the snapshot is read or changed
+        self.refresh_lock = threading.Lock()  # one refresh at a time, its queries run without holding lock
+        self.snapshot = IndexSnapshot()
+        self.rebuilding = False
+        self.rebuilds = 0
+
+    # function that returns the highest ids and the numbers of products and categories with a single statement
+    def probe(self):
+        return self.db.session.execute(select(
+            select(func.max(self.Product.id)).scalar_subquery(),
+            select(func.count(self.Product.id)).scalar_subquery(),
+            select(func.max(self.Category.id)).scalar_subquery(),
+            select(func.count(self.Category.id)).scalar_subquery(),
+        )).one()
+
+    # function that adds products and categories created since the last refresh
+    # products are only ever added, so rows newer than the last seen ids are added in place, while rows committed
+    # out of id order show up as fewer indexed rows than the tables hold and are picked up by a rebuild in the background
+    def refresh(self):
+        with self.refresh_lock:
+            now = time.monotonic()
+            if self.checked_at is not None and now - self.checked_at < self.check_interval:
+                return
+            self.checked_at = now
+
+            max_product_id, products_count, max_category_id, categories_count = self.probe()
+            with self.lock:
+                snapshot = self.snapshot
+                last_category_id, last_product_id = snapshot.last_category_id, snapshot.last_product_id
+
+            categories = products = None
+            if (max_category_id or 0) > last_category_id:
+                categories = self.load_categories(last_category_id)
+            if (max_product_id or 0) > last_product_id:
+                products = self.load_products(last_product_id)
+
+            # adding rows twice changes nothing, so they can be added to a snapshot swapped in by a rebuild meanwhile
+            with self.lock:
+                snapshot = self.snapshot
+                if categories:
+                    snapshot.add_categories(categories)
+                if products:
+                    snapshot.add_products(*products)
+                missing = len(snapshot.product_keys) < products_count or len(snapshot.category_keys) < categories_count
+
+            if missing:
+                self.schedule_rebuild()
+
+    def load_categories(self, after_id):
+        return (
+            self.db.session.query(self.Category.id, self.Category.name)
+            .filter(self.Category.id > after_id)
+            .all()
+        )
+
+    # categories are linked to a product in the same transaction that creates it
+    def load_products(self, after_id):
+        products = (
+            self.db.session.query(self.Product.id, self.Product.name)
+            .filter(self.Product.id > after_id)
+            .all()
+        )
+        links = (
+            self.db.session.query(self.ProductCategory.product_id, self.ProductCategory.category_id)
+            .filter(self.ProductCategory.product_id > after_id)
+            .all()
+        ) if products else []
+        return products, links
+
+    # function that starts a rebuild of the whole index in a background thread, searches keep using the current one
+    def schedule_rebuild(self):
+        if self.rebuilding:
+            return
+        self.rebuilding = True
+        app = current_app._get_current_object()
+        threading.Thread(target=self.rebuild, args=(app,), name="search-index-rebuild", daemon=True).start()
+
+    def rebuild(self, app):
+        try:
+            with app.app_context():
+                snapshot = IndexSnapshot()
+                snapshot.add_categories(self.load_categories(0))
+                snapshot.add_products(*self.load_products(0))
+
+            # rows added after the snapshot was read are added by the next refresh
+            with self.lock:
+                self.snapshot = snapshot
+                self.rebuilds += 1
+        except Exception as e:
+            print(f"Failed to rebuild the search index: {e}")
+        finally:
+            self.rebuilding = False
+
+    # function that returns ids of products and categories matching the search
+    # products must have a name containing name and a category containing category
+    # categories must have a name containing category and a product containing name
+    def search(self, name, category):
+        self.refresh()
+        with self.lock:
+            snapshot = self.snapshot
+
+            if name:
+                product_ids = snapshot.match(snapshot.product_keys, snapshot.product_grams, name)
+            if category:
+                category_ids = snapshot.match(snapshot.category_keys, snapshot.category_grams, category)
+
+            if name and category:
+                products = {id for id in product_ids if not snapshot.product_categories.get(id, set()).isdisjoint(category_ids)}
+                categories = {id for id in category_ids if not snapshot.category_products.get(id, set()).isdisjoint(product_ids)}
+            elif name:
+                products = product_ids
+                categories = set().union(*(snapshot.product_categories.get(id, set()) for id in product_ids))
+            elif category:
+                products = set().union(*(snapshot.category_products.get(id, set()) for id in category_ids))
+                categories = category_ids
+            else:
+                products = set(snapshot.product_keys)
+                categories = set(snapshot.category_keys)
+
+            return sorted(products), [snapshot.category_names[id] for id in sorted(categories)]
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+from solcx import install_solc, set_solc_version, compile_standard
+
+# version of the compiler, bumping it invalidates every artifact
+SOLC_VERSION = "0.8.0"
+# version of the artifact format
+ARTIFACT_VERSION = 1
+
+CONTRACT_FILE = Path("contract.sol")
+ARTIFACT_FILE = Path("contract.json")
+
+OUTPUT_SELECTION = {
+    "*": {
+        "*": ["abi", "evm.bytecode.object"]
+    }
+}
+
+
+# function that returns the key of the artifact compiled from the given source
+def source_hash(source):
+    key = json.dumps({"solc": SOLC_VERSION, "source": source, "output": OUTPUT_SELECTION}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+# function that compiles the source and returns ABI and Bytecode of every contract in it
+def compile_source(source):
+    # set version
+    install_solc(SOLC_VERSION)
+    set_solc_version(SOLC_VERSION)
+
+    # compile the contract
+    compiled_sol = compile_standard({
+        "language": "Solidity",
+        "sources": {
+            "contract.sol": {
+                "content": source
+            }
+        },
+        "settings": {
+            "outputSelection": OUTPUT_SELECTION
+        }
+    })
+
+    # extract the ABI and Bytecode of every contract
+    return {
+        contract_name: {"abi": contract["abi"], "bytecode": contract["evm"]["bytecode"]["object"]}
+        for contract_name, contract in compiled_sol["contracts"]["contract.sol"].items()
+    }
+
+
+# function that returns contracts of the artifact if it was compiled from the given source, otherwise None
+def read_artifact(artifact_file, source):
+    try:
+        artifact = json.loads(Path(artifact_file).read_text())
+    except (OSError, ValueError):
+        return None
+
+    if artifact.get("version") != ARTIFACT_VERSION or artifact.get("source_hash") != source_hash(source):
+        return None
+    return artifact["contracts"]
+
+
+# function that writes the artifact of contracts compiled from the given source
+# the file is replaced at once, so processes starting at the same time never read half of it
+def write_artifact(artifact_file, source, contracts):
+    artifact = {
+        "version": ARTIFACT_VERSION,
+        "solc": SOLC_VERSION,
+        "source_hash": source_hash(source),
+        "contracts": contracts,
+    }
+    artifact_file = Path(artifact_file)
+    temporary_file = artifact_file.with_name(f"{artifact_file.name}.{os.getpid()}.tmp")
+    temporary_file.write_text(json.dumps(artifact))
+    os.replace(temporary_file, artifact_file)
+
+
+# function that returns ABI and Bytecode of every contract in the contract file
+# the artifact is used when it matches the source, otherwise the source is compiled and the artifact rewritten
+def load_contracts(contract_file=CONTRACT_FILE, artifact_file=ARTIFACT_FILE):
+    source = Path(contract_file).read_text()
+
+    contracts = read_artifact(artifact_file, source)
+    if contracts is not None:
+        return contracts
+
+    contracts = compile_source(source)
+    try:
+        write_artifact(artifact_file, source, contracts)
+    except OSError as e:
+        # the contracts can still be used, they are compiled again by the next process
+        print(f"Failed to write contract artifact: {e}")
+    return contracts
+
+
+# compiles the contract when the image is built, so services start without running solc
+# python contract_artifact.py [contract.sol] [contract.json]
+if __name__ == "__main__":
+    contract_file = Path(sys.argv[1]) if len(sys.argv) > 1 else CONTRACT_FILE
+    artifact_file = Path(sys.argv[2]) if len(sys.argv) > 2 else ARTIFACT_FILE
+
+    source = contract_file.read_text()
+    write_artifact(artifact_file, source, compile_source(source))
+    print(f"Wrote {artifact_file} ({source_hash(source)})")
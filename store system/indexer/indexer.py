@@ -0,0 +1,197 @@
+# indexer that follows new blocks and mirrors events of order contracts into the ContractState table
+# the last indexed block is stored in the IndexerCheckpoint table in the same transaction as the states
+#
+# python indexer.py
+
+import os
+import time
+
+from flask import Flask
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+
+from orm import db, Order, ContractState, IndexerCheckpoint
+from contract_artifact import load_contracts
+from contract_registry import ContractRegistry
+from rpc_provider import PooledHTTPProvider
+
+# read the environment variables
+host = os.getenv("DB_HOST", "localhost")
+port = int(os.getenv("DB_PORT", 3306))
+user = os.getenv("DB_USER", "")
+password = os.getenv("DB_PASSWORD", "")
+database = os.getenv("DB_NAME", "")
+provider_url = os.getenv("PROVIDER_URL", "http://ganache:8545")
+
+START_BLOCK = int(os.getenv("INDEXER_START_BLOCK", 0))
+CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", 0))  # blocks left behind the head in case of reorganizations
+BLOCK_RANGE = int(os.getenv("INDEXER_BLOCK_RANGE", 1000))  # maximum number of blocks read with one request
+POLL_INTERVAL = float(os.getenv("INDEXER_POLL_INTERVAL", 1))
+# seconds events of contracts unknown to the database are waited for before they are taken as foreign and skipped
+UNRESOLVED_TIMEOUT = float(os.getenv("INDEXER_UNRESOLVED_TIMEOUT", 60))
+
+# options of the connection to the blockchain
+provider_options = {
+    "pool_size": int(os.getenv("RPC_POOL_SIZE", 20)),
+    "connect_timeout": float(os.getenv("RPC_CONNECT_TIMEOUT", 3)),
+    "read_timeout": float(os.getenv("RPC_READ_TIMEOUT", 30)),
+    "retries": int(os.getenv("RPC_RETRIES", 3)),
+}
+
+# initialize the app
+app = Flask(__name__)
+app.config['SQLALCHEMY_DATABASE_URI'] = f'mysql+mysqlconnector://{user}:{password}@{host}:{port}/{database}'
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# initialize the database
+db.init_app(app)
+
+
+class ChainIndexer:
+
+    def __init__(self, w3, contracts, registry, name="contracts", confirmations=0, block_range=1000, unresolved_timeout=60):
+        self.w3 = w3
+        self.registry = registry
+        self.name = name
+        self.confirmations = confirmations
+        self.block_range = block_range
+
+        # events whose order was not in the database, (transaction hash, log index) -> (time first seen, block)
+        self.unresolved_timeout = unresolved_timeout
+        self.unresolved = {}
+
+        # events by their topic, with a flag telling whether they come from the order registry
+        self.events = {}
+        for contract_name, is_registry in [("OrderContract", False), ("OrderRegistry", True)]:
+            abi = contracts[contract_name]["abi"]
+            contract = self.w3.eth.contract(abi=abi)
+            for entry in abi:
+                if entry["type"] == "event":
+                    self.events[event_abi_to_log_topic(entry)] = (contract.events[entry["name"]](), is_registry)
+
+    # function that returns the last indexed block
+    def checkpoint(self):
+        checkpoint = db.session.get(IndexerCheckpoint, self.name)
+        return checkpoint.block_number if checkpoint else START_BLOCK - 1
+
+    # function that indexes the next range of blocks and returns whether the checkpoint moved
+    # the checkpoint stops before the first event whose order is not known yet, so that event is read again later
+    def index_next(self):
+        last_block = self.checkpoint()
+        head = self.w3.eth.block_number - self.confirmations
+        if head <= last_block:
+            return False
+
+        to_block = min(head, last_block + self.block_range)
+        logs = self.w3.eth.get_logs({
+            "fromBlock": last_block + 1,
+            "toBlock": to_block,
+            "topics": [[Web3.to_hex(topic) for topic in self.events]],
+        })
+        unresolved_block = self.apply(logs)
+        if unresolved_block is not None:
+            # events of earlier blocks are stored, the rest are applied again, which changes nothing for those already applied
+            to_block = unresolved_block - 1
+        if to_block <= last_block:
+            db.session.commit()
+            return False
+
+        checkpoint = db.session.get(IndexerCheckpoint, self.name)
+        if checkpoint is None:
+            db.session.add(IndexerCheckpoint(name=self.name, block_number=to_block))
+        else:
+            checkpoint.block_number = to_block
+        db.session.commit()
+
+        # events behind the checkpoint are not read again
+        self.unresolved = {key: value for key, value in self.unresolved.items() if value[1] > to_block}
+        return True
+
+    # function that applies the given logs to the contract states
+    # returns the block of the first event whose order is not in the database yet, or None
+    def apply(self, logs):
+        decoded = []
+        for log in logs:
+            event, is_registry = self.events[log["topics"][0]]
+            decoded.append((log, event.process_log(log), is_registry))
+
+        # orders with a contract of their own are found by its address, registry events carry the order id
+        registry_address = self.registry.get("OrderRegistry")
+        addresses = {log["address"] for log, _, is_registry in decoded if not is_registry}
+        registry_ids = {event["args"]["id"] for log, event, is_registry in decoded if is_registry}
+
+        order_ids = {}
+        if addresses:
+            order_ids = dict(db.session.query(Order.address, Order.id).filter(Order.address.in_(addresses)))
+        known_ids = set(order_ids.values())
+        if registry_ids:
+            known_ids.update(order_id for order_id, in db.session.query(Order.id).filter(Order.id.in_(registry_ids)))
+
+        states = {}
+        if known_ids:
+            states = {state.order_id: state for state in ContractState.query.filter(ContractState.order_id.in_(known_ids))}
+
+        unresolved_block = None
+        now = time.monotonic()
+        for log, event, is_registry in decoded:
+            if is_registry:
+                order_id = event["args"]["id"] if log["address"] == registry_address else None
+            else:
+                order_id = order_ids.get(log["address"])
+
+            # the order of a contract mined moments ago may not be committed yet, so its events are waited for
+            # events of contracts that still belong to no order after unresolved_timeout are skipped
+            if order_id not in known_ids:
+                key = (Web3.to_hex(log["transactionHash"]), log["logIndex"])
+                first_seen, _ = self.unresolved.setdefault(key, (now, log["blockNumber"]))
+                if now - first_seen < self.unresolved_timeout and unresolved_block is None:
+                    unresolved_block = log["blockNumber"]
+                continue
+
+            state = states.get(order_id)
+            if state is None:
+                state = ContractState(order_id=order_id, contract_address=log["address"], paid=False, courier_bound=False, delivered=False)
+                db.session.add(state)
+                states[order_id] = state
+
+            if event["event"] == "Paid":
+                state.paid = True
+            elif event["event"] == "CourierBound":
+                state.courier_bound = True
+                state.courier = event["args"]["courier"]
+            elif event["event"] == "Delivered":
+                state.delivered = True
+            state.block_number = log["blockNumber"]
+
+        return unresolved_block
+
+    def run(self, poll_interval):
+        while True:
+            try:
+                if not self.index_next():
+                    time.sleep(poll_interval)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Indexing failed ({e}), retrying in {poll_interval}s...")
+                time.sleep(poll_interval)
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        # wait until the database accepts connections
+        while True:
+            try:
+                db.create_all()
+                break
+            except Exception as e:
+                print(f"Database not available ({e}), retrying in 3s...")
+            time.sleep(3)
+
+        indexer = ChainIndexer(
+            Web3(PooledHTTPProvider(provider_url, **provider_options)),
+            load_contracts(),
+            ContractRegistry(app.config['SQLALCHEMY_DATABASE_URI']),
+            confirmations=CONFIRMATIONS,
+            block_range=BLOCK_RANGE,
+            unresolved_timeout=UNRESOLVED_TIMEOUT,
+        )
+        indexer.run(POLL_INTERVAL)
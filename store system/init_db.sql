@@ -26,7 +26,10 @@ CREATE TABLE IF NOT EXISTS `Order` (
     email VARCHAR(256) NOT NULL,
     status ENUM('CREATED', 'PENDING', 'COMPLETE') NOT NULL DEFAULT 'CREATED',
     timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    address VARCHAR(256) NOT NULL
+    address VARCHAR(256) NOT NULL,
+    price DECIMAL(10,2) NOT NULL DEFAULT 0,
+    customer_address VARCHAR(256) NOT NULL DEFAULT '',
+    INDEX (address)
 );
 
 CREATE TABLE IF NOT EXISTS OrderProduct (
@@ -37,3 +40,60 @@ CREATE TABLE IF NOT EXISTS OrderProduct (
     FOREIGN KEY (order_id) REFERENCES `Order`(id) ON DELETE CASCADE,
     FOREIGN KEY (product_id) REFERENCES Product(id) ON DELETE CASCADE
 );
+
+CREATE TABLE IF NOT EXISTS ProductSales (
+    product_id INT PRIMARY KEY,
+    sold INT NOT NULL DEFAULT 0,
+    waiting INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (product_id) REFERENCES Product(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS CategorySales (
+    category_id INT PRIMARY KEY,
+    delivered INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (category_id) REFERENCES Category(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS Nonce (
+    address VARCHAR(42) PRIMARY KEY,
+    next_nonce BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS NonceGap (
+    address VARCHAR(42) NOT NULL,
+    nonce BIGINT NOT NULL,
+    PRIMARY KEY (address, nonce)
+);
+
+CREATE TABLE IF NOT EXISTS ContractRegistry (
+    name VARCHAR(64) PRIMARY KEY,
+    address VARCHAR(42) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ContractState (
+    order_id INT PRIMARY KEY,
+    contract_address VARCHAR(42) NOT NULL,
+    paid BOOLEAN NOT NULL DEFAULT FALSE,
+    courier_bound BOOLEAN NOT NULL DEFAULT FALSE,
+    courier VARCHAR(42) NULL,
+    delivered BOOLEAN NOT NULL DEFAULT FALSE,
+    block_number BIGINT NOT NULL,
+    FOREIGN KEY (order_id) REFERENCES `Order`(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS IndexerCheckpoint (
+    name VARCHAR(64) PRIMARY KEY,
+    block_number BIGINT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS PayoutOutbox (
+    order_id INT PRIMARY KEY,
+    contract_address VARCHAR(256) NOT NULL,
+    status ENUM('PENDING', 'DONE') NOT NULL DEFAULT 'PENDING',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    transaction_hash VARCHAR(66) NULL,
+    last_error VARCHAR(512) NULL,
+    INDEX (status, next_attempt),
+    FOREIGN KEY (order_id) REFERENCES `Order`(id) ON DELETE CASCADE
+);
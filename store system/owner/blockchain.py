@@ -1,6 +1,6 @@
-from solcx import install_solc, set_solc_version, compile_standard
 from web3 import Web3, HTTPProvider
 from pathlib import Path
+from contract_artifact import load_contracts
 
 class GanacheClient:
 
@@ -24,37 +24,11 @@ class GanacheClient:
             cls._instance = super().__new__(cls)
         return cls._instance
 
+    # function that returns ABI and Bytecode of the contract
+    # they are read from the artifact built with the image, solc only runs when contract.sol has changed
     def compile_contract(self):
-        # set version
-        install_solc("0.8.0")
-        set_solc_version("0.8.0")
-
-        # read the contract content
-        source = self.contract_file.read_text()
-
-        # compile the contract
-        compiled_sol = compile_standard({
-            "language": "Solidity",
-            "sources": {
-                "contract.sol": {
-                    "content": source
-                }
-            },
-            "settings": {
-                "outputSelection": {
-                    "*": {
-                        "*": ["abi", "evm.bytecode.object"]
-                    }
-                }
-            }
-        })
-
-        # extract the ABI and Bytecode of the contract
-        contract_name = "OrderContract"
-        abi = compiled_sol["contracts"]["contract.sol"][contract_name]["abi"]
-        bytecode = compiled_sol["contracts"]["contract.sol"][contract_name]["evm"]["bytecode"]["object"]
-
-        return abi, bytecode
+        contract = load_contracts(self.contract_file)["OrderContract"]
+        return contract["abi"], contract["bytecode"]
 
     def get_owner_account(self):
         # first 10 accounts are created when initialized the system, and owners is 11th
@@ -1,4 +1,5 @@
 #!/bin/bash
 
 python init.py
-python owner_api.py
\ No newline at end of file
+python migrate.py
+python owner_api.py
@@ -0,0 +1,33 @@
+# migrations of the store database, run by initialize.sh before the owner service starts
+# every step only changes a database that needs it, so starting the service again changes nothing
+#
+# python migrate.py
+
+from sqlalchemy import inspect
+
+from owner_api import app, db, storeDatabaseService
+from orm import ProductSales, CategorySales
+from sales_counters import wait_for_database
+
+
+def migrate():
+    wait_for_database()
+
+    # sales counter tables created now are filled from the order history once, the services keep them up to date afterwards
+    tables = set(inspect(db.engine).get_table_names())
+    db.create_all()
+    storeDatabaseService.migrate_orders()
+
+    if ProductSales.__tablename__ not in tables:
+        storeDatabaseService.rebuild_product_sales()
+        print("Product sales counters filled from the order history.")
+    if CategorySales.__tablename__ not in tables:
+        storeDatabaseService.rebuild_category_sales()
+        print("Category sales counters filled from the order history.")
+
+    print("Database migrated.")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        migrate()
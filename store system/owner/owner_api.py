@@ -1,7 +1,7 @@
 from flask import Flask, jsonify, request
 import os
-from jwtauth import JWTAuth
-from orm import db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory
+from auth import auth_metrics, require_role
+from orm import db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales
 from owner_database_service import OwnerDatabaseService
 import csv
 import io
@@ -21,48 +21,43 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
 # create service for interacting with database
-storeDatabaseService = OwnerDatabaseService(db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory)
-
-# function for JWT authentication
-def auth(role):
-    token = request.headers.get('Authorization')
-    if not token:
-        return "", "", 401
-
-    email, r = JWTAuth.validate_token(token.replace('Bearer ', ''))
-    if not email or not r or r != role:
-        return "", "", 401
-
-    return email, role, 200
-
-# function that parses given CSV file, format product data and return it
-def parse_csv(file):
-    # open given file
-    stream = io.StringIO(file.stream.read().decode("utf-8"))
-    csv_reader = csv.reader(stream)
-
-    # parse it and format products
-    products = []
-    for index, row in enumerate(csv_reader):
+storeDatabaseService = OwnerDatabaseService(db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales)
+
+# number of CSV lines validated and inserted together
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 1000))
+
+# function that reads rows of given CSV file, decoding the uploaded stream incrementally
+def read_csv(file):
+    file.stream.seek(0)
+    stream = io.TextIOWrapper(file.stream, encoding="utf-8", newline="")
+    try:
+        yield from csv.reader(stream)
+    finally:
+        # leave the uploaded stream open so the file can be read again
+        stream.detach()
+
+# function that checks whether every line of given CSV file has the right number of values
+def check_csv(file):
+    for index, row in enumerate(read_csv(file)):
         if len(row) != 3:
             return f"Incorrect number of values on line {index}.", 400
 
+    return "", 200
+
+# function that parses given CSV file and yields formatted product data line by line
+def parse_csv(file):
+    for row in read_csv(file):
         categories = [c.strip() for c in row[0].split('|')]
         name = row[1].strip()
         price = row[2].strip()
 
-        products.append((categories, name, price))
-
-    return products, 200
+        yield categories, name, price
 
 # endpoint for adding products to the database
 # product info is in CSV file that is sent
 @app.route('/update', methods=['POST'])
+@require_role('owner')
 def update():
-    email, role, status = auth('owner')
-    if status != 200:
-        return jsonify({'msg': "Missing Authorization Header"}), status
-
     # check if file is missing in the request
     if 'file' not in request.files:
         return jsonify({'message': 'Field file is missing.'}), 400
@@ -71,35 +66,37 @@ def update():
     if file.filename == '':
         return jsonify({'message': 'Field file missing.'}), 400
 
-    # parse the file
-    products, status = parse_csv(file)
+    # check the format of the whole file before adding any product
+    message, status = check_csv(file)
     if status != 200:
-        return jsonify({"message": products}), status
+        return jsonify({"message": message}), status
 
-    # add all products
-    message, status = storeDatabaseService.add_products(products)
+    # parse the file again and add products chunk by chunk
+    message, status = storeDatabaseService.add_products(parse_csv(file), IMPORT_CHUNK_SIZE)
 
     return jsonify({"message": message}), status
 
 # endpoint that returns statistics for products that have been sold at least once
 @app.route('/product_statistics', methods=['GET'])
+@require_role('owner')
 def product_statistics():
-    email, role, status = auth('owner')
-    if status != 200:
-        return jsonify({'msg': "Missing Authorization Header"}), status
-
     stats = storeDatabaseService.product_stats()
     return jsonify({"statistics": stats}), 200
 
 # endpoint that returns category names sorted by number of sold products and by name
 @app.route('/category_statistics', methods=['GET'])
+@require_role('owner')
 def category_statistics():
-    email, role, status = auth('owner')
-    if status != 200:
-        return jsonify({'msg': "Missing Authorization Header"}), status
-
     stats = storeDatabaseService.category_stats()
     return jsonify({"statistics": stats}), 200
 
+# endpoint that returns latency of request authentication and counters of the token cache
+@app.route('/metrics', methods=['GET'])
+@require_role('owner')
+def metrics():
+    return jsonify({
+        "auth": auth_metrics.stats(),
+    }), 200
+
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0", port=5001)
\ No newline at end of file
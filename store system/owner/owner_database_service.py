@@ -1,7 +1,8 @@
-from sqlalchemy import func, case
+from sqlalchemy import func, case, insert, inspect, select, text, update
+from itertools import islice
 
 class OwnerDatabaseService:
-    def __init__(self, db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory):
+    def __init__(self, db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales):
         self.db = db
         self.Product = Product
         self.Category = Category
@@ -9,11 +10,39 @@ class OwnerDatabaseService:
         self.OrderProduct = OrderProduct
         self.OrderStatus = OrderStatus
         self.ProductCategory = ProductCategory
+        self.ProductSales = ProductSales
+        self.CategorySales = CategorySales
+
+    # maximum number of values bound in a single IN (...) lookup
+    LOOKUP_CHUNK_SIZE = 1000
 
     # function that adds given products to the database
-    def add_products(self, products):
-        added = []
-        for index, entry in enumerate(products):
+    # products can be any iterable, it is consumed in chunks of chunk_size lines and every chunk
+    # is validated and inserted with a few set-based statements inside a single transaction
+    def add_products(self, products, chunk_size=1000):
+        try:
+            index = 0
+            for chunk in self.chunks(products, chunk_size):
+                message, status = self.add_chunk(chunk, index)
+                if status != 200:
+                    self.db.session.rollback()
+                    return message, status
+                index += len(chunk)
+
+            self.db.session.commit()
+        except Exception:
+            self.db.session.rollback()
+            raise
+
+        return "", 200
+
+    # function that validates and inserts one chunk of products, first line of the chunk has given index
+    # products inserted by earlier chunks are visible to the lookups since they share the transaction
+    def add_chunk(self, products, first_index):
+        existing = self.existing_product_names({name for _, name, _ in products})
+        seen = set()
+        rows = []
+        for index, entry in enumerate(products, start=first_index):
             categories, name, price = entry
             # check if the price is float and greater than 0
             try:
@@ -24,80 +53,278 @@ class OwnerDatabaseService:
             if price < 0:
                 return f"Incorrect price on line {index}.", 400
 
-            price = float(price)
-
-            # check if the product already exists
-            product_record = self.Product.query.filter_by(name=name).first()
-            if product_record:
+            # check if the product already exists (in the database or earlier in the file)
+            if self.key(name) in existing or self.key(name) in seen:
                 return f"Product {name} already exists.", 400
+            seen.add(self.key(name))
 
-            # create a product
-            product = self.Product(name=name, price=price)
-
-            # check if any of the categories is missing and add it to the databases
-            cat_objs = []
+            # drop categories repeated on the same line
+            unique = {}
             for cat in categories:
-                category = self.Category.query.filter_by(name=cat).first()
-                if not category:
-                    category = self.Category(name=cat)
-                    self.db.session.add(category)
-                    self.db.session.flush()
-                cat_objs.append(category)
-
-            product.categories = cat_objs
-            added.append(product)
-
-        # insert every product to the database
-        for product in added:
-            self.db.session.add(product)
-            self.db.session.commit()
+                unique.setdefault(self.key(cat), cat)
+            rows.append((list(unique.values()), name, price))
+
+        # insert missing categories and get ids of all categories used in the chunk
+        category_ids = self.resolve_categories({cat for categories, _, _ in rows for cat in categories})
+
+        # insert products and read back their ids
+        if rows:
+            self.db.session.execute(
+                insert(self.Product),
+                [{"name": name, "price": price} for _, name, price in rows]
+            )
+        product_ids = self.product_ids([name for _, name, _ in rows])
+
+        # link products with their categories
+        links = [
+            {"product_id": product_ids[self.key(name)], "category_id": category_ids[self.key(cat)]}
+            for categories, name, _ in rows
+            for cat in categories
+        ]
+        if links:
+            self.db.session.execute(insert(self.ProductCategory), links)
+
+        # start sales counters of new products at zero
+        if product_ids:
+            self.db.session.execute(
+                insert(self.ProductSales),
+                [{"product_id": id, "sold": 0, "waiting": 0} for id in product_ids.values()]
+            )
 
         return "", 200
 
+    # function that returns the lookup key of a name
+    # names are compared case-insensitively, the same way the database collation compares them
+    @staticmethod
+    def key(name):
+        return name.lower()
+
+    # function that splits given values into lists of at most size elements
+    def chunks(self, values, size=None):
+        values = iter(values)
+        size = size or self.LOOKUP_CHUNK_SIZE
+        while chunk := list(islice(values, size)):
+            yield chunk
+
+    # function that returns which of the given product names already exist in the database
+    def existing_product_names(self, names):
+        existing = set()
+        for chunk in self.chunks(names):
+            rows = self.db.session.query(self.Product.name).filter(self.Product.name.in_(chunk))
+            existing.update(self.key(name) for name, in rows)
+        return existing
+
+    # function that maps given product names to their ids
+    def product_ids(self, names):
+        ids = {}
+        for chunk in self.chunks(names):
+            rows = self.db.session.query(self.Product.name, self.Product.id).filter(self.Product.name.in_(chunk))
+            ids.update((self.key(name), id) for name, id in rows)
+        return ids
+
+    # function that maps given category names to their ids, inserting the missing ones
+    def resolve_categories(self, names):
+        ids = {}
+        for chunk in self.chunks(names):
+            rows = self.db.session.query(self.Category.name, self.Category.id).filter(self.Category.name.in_(chunk))
+            ids.update((self.key(name), id) for name, id in rows)
+
+        missing = {}
+        for name in names:
+            if self.key(name) not in ids:
+                missing.setdefault(self.key(name), name)
+        missing = list(missing.values())
+        if missing:
+            self.db.session.execute(insert(self.Category), [{"name": name} for name in missing])
+            created = []
+            for chunk in self.chunks(missing):
+                rows = self.db.session.query(self.Category.name, self.Category.id).filter(self.Category.name.in_(chunk))
+                for name, id in rows:
+                    ids[self.key(name)] = id
+                    created.append({"category_id": id, "delivered": 0})
+
+            # start sales counters of new categories at zero
+            self.db.session.execute(insert(self.CategorySales), created)
+
+        return ids
+
+    # columns of the Order table added after the first release, with their definitions from init_db.sql
+    ORDER_COLUMNS = {
+        "price": "DECIMAL(10,2) NOT NULL DEFAULT 0",
+        "customer_address": "VARCHAR(256) NOT NULL DEFAULT ''",
+    }
+
+    # function that adds the columns and indexes missing from Order tables created before they were added
+    # can be run on every start, columns and indexes that exist are left alone
+    # prices of existing orders are filled in once, when the price column is added
+    def migrate_orders(self):
+        table = self.Order.__tablename__
+        inspector = inspect(self.db.engine)
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        indexed = {tuple(index["column_names"]) for index in inspector.get_indexes(table)}
+        quoted = self.db.engine.dialect.identifier_preparer.quote(table)
+        added = [name for name in self.ORDER_COLUMNS if name not in columns]
+        with self.db.engine.begin() as connection:
+            for name in added:
+                connection.execute(text(f"ALTER TABLE {quoted} ADD COLUMN {name} {self.ORDER_COLUMNS[name]}"))
+            for index in self.Order.__table__.indexes:
+                if tuple(column.name for column in index.columns) not in indexed:
+                    index.create(connection)
+
+        if "price" in added:
+            self.backfill_order_prices()
+
+    # function that sets the price of orders created before it was stored
+    # their products are priced as they are now, since earlier prices were never kept
+    def backfill_order_prices(self):
+        try:
+            total = (
+                select(func.coalesce(func.sum(self.Product.price * self.OrderProduct.quantity), 0))
+                .select_from(self.OrderProduct)
+                .join(self.Product, self.Product.id == self.OrderProduct.product_id)
+                .where(self.OrderProduct.order_id == self.Order.id)
+                .scalar_subquery()
+            )
+            self.db.session.execute(update(self.Order).where(self.Order.price == 0).values(price=total))
+            self.db.session.commit()
+        except Exception:
+            self.db.session.rollback()
+            raise
+
     # function that returns product statistics
+    # statistics are read from sales counters that are maintained when orders change status
     def product_stats(self):
         # create and execute query
         stats = (
+            self.db.session.query(self.Product.name, self.ProductSales.sold, self.ProductSales.waiting)
+            .join(self.ProductSales, self.ProductSales.product_id == self.Product.id)
+            .filter(self.ProductSales.sold + self.ProductSales.waiting > 0)
+            .order_by(self.Product.id)
+        )
+
+        # format the result
+        stats = [
+            {"name": name, "sold": int(sold), "waiting": int(waiting)}
+            for name, sold, waiting in stats.all()
+        ]
+
+        return stats
+
+    # function that computes sales counters of every product from the order history
+    def live_product_sales(self):
+        return (
             self.db.session.query(
-                self.Product.name,
-                func.sum(
+                self.Product.id,
+                func.coalesce(func.sum(
                     case((self.Order.status == "COMPLETE", self.OrderProduct.quantity), else_=0)
-                ).label("sold"),
-                func.sum(
+                ), 0).label("sold"),
+                func.coalesce(func.sum(
                     case((self.Order.status != "COMPLETE", self.OrderProduct.quantity), else_=0)
-                ).label("waiting")
+                ), 0).label("waiting")
             )
-            .join(self.OrderProduct)
-            .join(self.Order)
+            .outerjoin(self.OrderProduct, self.OrderProduct.product_id == self.Product.id)
+            .outerjoin(self.Order, self.Order.id == self.OrderProduct.order_id)
             .group_by(self.Product.id)
         )
 
-        # format the result
-        stats = [
-            {"name": name, "sold": int(sold or 0), "waiting": int(waiting or 0)}
-            for name, sold, waiting in stats.all()
-            if (sold or 0) + (waiting or 0) > 0
+    # function that recomputes sales counters of every product from scratch
+    def rebuild_product_sales(self):
+        try:
+            self.db.session.query(self.ProductSales).delete()
+            self.db.session.execute(
+                insert(self.ProductSales).from_select(
+                    ["product_id", "sold", "waiting"],
+                    self.live_product_sales().statement
+                )
+            )
+            self.db.session.commit()
+        except Exception:
+            self.db.session.rollback()
+            raise
+
+    # function that compares sales counters with the order history and returns products that differ
+    def check_product_sales(self):
+        live = self.live_product_sales().subquery()
+        rows = (
+            self.db.session.query(
+                self.Product.name,
+                self.ProductSales.sold, self.ProductSales.waiting,
+                live.c.sold, live.c.waiting
+            )
+            .join(live, live.c.id == self.Product.id)
+            .outerjoin(self.ProductSales, self.ProductSales.product_id == self.Product.id)
+            .order_by(self.Product.id)
+        )
+
+        mismatches = [
+            {"name": name, "sold": sold, "waiting": waiting, "expected_sold": int(expected_sold), "expected_waiting": int(expected_waiting)}
+            for name, sold, waiting, expected_sold, expected_waiting in rows.all()
+            if (sold, waiting) != (int(expected_sold), int(expected_waiting))
         ]
 
-        return stats
+        return mismatches
 
     # function that returns category statistics
+    # categories are ranked by counters that are maintained when orders are delivered
     def category_stats(self):
         # create and execute query
-        delivered = func.coalesce(
-            func.sum(case((self.Order.status == "COMPLETE", self.OrderProduct.quantity), else_=0)), 0
-        ).label("delivered")
+        delivered = func.coalesce(self.CategorySales.delivered, 0)
         stats = (
-            self.db.session.query(self.Category.name, delivered)
+            self.db.session.query(self.Category.name)
+            .outerjoin(self.CategorySales, self.CategorySales.category_id == self.Category.id)
+            .order_by(delivered.desc(), self.Category.name.asc())
+        )
+
+        # format the result
+        stats = [name for name, in stats.all()]
+
+        return stats
+
+    # function that computes delivered quantities of every category from the order history
+    def live_category_sales(self):
+        return (
+            self.db.session.query(
+                self.Category.id,
+                func.coalesce(
+                    func.sum(case((self.Order.status == "COMPLETE", self.OrderProduct.quantity), else_=0)), 0
+                ).label("delivered")
+            )
             .outerjoin(self.ProductCategory, self.ProductCategory.category_id == self.Category.id)
             .outerjoin(self.Product, self.Product.id == self.ProductCategory.product_id)
             .outerjoin(self.OrderProduct, self.OrderProduct.product_id == self.Product.id)
             .outerjoin(self.Order, self.Order.id == self.OrderProduct.order_id)
             .group_by(self.Category.id)
-            .order_by(delivered.desc(), self.Category.name.asc())
         )
 
-        # format the result
-        stats = [name for name, _ in stats.all()]
+    # function that recomputes delivered quantities of every category from scratch
+    def rebuild_category_sales(self):
+        try:
+            self.db.session.query(self.CategorySales).delete()
+            self.db.session.execute(
+                insert(self.CategorySales).from_select(
+                    ["category_id", "delivered"],
+                    self.live_category_sales().statement
+                )
+            )
+            self.db.session.commit()
+        except Exception:
+            self.db.session.rollback()
+            raise
+
+    # function that compares category counters with the order history and returns categories that differ
+    def check_category_sales(self):
+        live = self.live_category_sales().subquery()
+        rows = (
+            self.db.session.query(self.Category.name, self.CategorySales.delivered, live.c.delivered)
+            .join(live, live.c.id == self.Category.id)
+            .outerjoin(self.CategorySales, self.CategorySales.category_id == self.Category.id)
+            .order_by(self.Category.id)
+        )
+
+        mismatches = [
+            {"name": name, "delivered": delivered, "expected_delivered": int(expected_delivered)}
+            for name, delivered, expected_delivered in rows.all()
+            if delivered != int(expected_delivered)
+        ]
 
-        return stats
\ No newline at end of file
+        return mismatches
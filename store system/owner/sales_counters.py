@@ -0,0 +1,61 @@
+# maintenance command for the sales counters behind /product_statistics and /category_statistics
+#
+# python sales_counters.py rebuild   recomputes the counters from the order history
+#                                    counter updates made while it runs are lost, so no orders should be placed meanwhile
+# python sales_counters.py check     compares the counters with the order history
+
+import sys
+import time
+
+from owner_api import app, db, storeDatabaseService
+
+
+# function that waits until the database accepts connections
+def wait_for_database():
+    while True:
+        try:
+            with db.engine.connect():
+                return
+        except Exception as e:
+            print(f"Database not available ({e}), retrying in 3s...")
+        time.sleep(3)
+
+
+def rebuild():
+    wait_for_database()
+    # create counter tables missing from databases initialized before they were added
+    db.create_all()
+    storeDatabaseService.rebuild_product_sales()
+    storeDatabaseService.rebuild_category_sales()
+    print("Sales counters rebuilt.")
+    return 0
+
+
+def check():
+    product_mismatches = storeDatabaseService.check_product_sales()
+    for mismatch in product_mismatches:
+        print(
+            f"Product {mismatch['name']}: sold {mismatch['sold']} (expected {mismatch['expected_sold']}), "
+            f"waiting {mismatch['waiting']} (expected {mismatch['expected_waiting']})"
+        )
+
+    category_mismatches = storeDatabaseService.check_category_sales()
+    for mismatch in category_mismatches:
+        print(f"Category {mismatch['name']}: delivered {mismatch['delivered']} (expected {mismatch['expected_delivered']})")
+
+    if product_mismatches or category_mismatches:
+        print(f"{len(product_mismatches)} product(s) and {len(category_mismatches)} category(ies) with inconsistent sales counters.")
+        return 1
+
+    print("Sales counters are consistent.")
+    return 0
+
+
+if __name__ == '__main__':
+    commands = {"rebuild": rebuild, "check": check}
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print(f"usage: python {sys.argv[0]} {'|'.join(commands)}")
+        sys.exit(2)
+
+    with app.app_context():
+        sys.exit(commands[sys.argv[1]]())
@@ -0,0 +1,57 @@
+# query budget of /search, a search returning any number of products issues a fixed number of statements
+#
+# python -m pytest tests/unit
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / "store system" / "owner"))
+sys.path.insert(1, str(Path(__file__).resolve().parent.parent.parent / "store system" / "customer"))
+
+from flask import Flask
+from orm import db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales, ContractState, PayoutOutbox, PayoutStatus
+from owner_database_service import OwnerDatabaseService
+from customer_database_service import CustomerDatabaseService
+from query_counter import assert_max_queries
+
+# probe of the tables for changes and one projection of the matching products
+MAX_QUERIES = 2
+
+
+@pytest.fixture
+def service():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:///:memory:"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    models = (db, Product, Category, Order, OrderProduct, OrderStatus, ProductCategory, ProductSales, CategorySales)
+
+    with app.app_context():
+        db.create_all()
+        products = [([f"Category{index % 7}", f"Other{index % 3}"], f"Match{index}", "1.99") for index in range(500)]
+        products += [([f"Category{index % 7}"], f"Product{index}", "1.99") for index in range(1000)]
+        OwnerDatabaseService(*models).add_products(products)
+
+        service = CustomerDatabaseService(*models, ContractState, PayoutOutbox, PayoutStatus)
+        service.search_index.refresh()
+        yield service
+
+
+def test_search_by_name_stays_within_query_budget(service):
+    with assert_max_queries(db.engine, MAX_QUERIES):
+        result = service.search_for_products("match", "")
+
+    assert len(result["products"]) == 500
+    assert all(len(product["categories"]) == 2 for product in result["products"])
+    assert sorted(result["categories"]) == [f"Category{index}" for index in range(7)] + [f"Other{index}" for index in range(3)]
+
+
+def test_search_by_category_stays_within_query_budget(service):
+    with assert_max_queries(db.engine, MAX_QUERIES):
+        result = service.search_for_products("", "category3")
+
+    assert len(result["products"]) == len(range(3, 500, 7)) + len(range(3, 1000, 7))
+    assert result["categories"] == ["Category3"]
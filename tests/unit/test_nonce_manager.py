@@ -0,0 +1,142 @@
+# tests for the NonceManager shared by the customer and courier services
+#
+# python -m pytest tests/unit
+
+import os
+import random
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / "store system" / "customer"))
+
+from nonce_manager import NonceManager
+
+ADDRESS = "0x0000000000000000000000000000000000000001"
+
+
+# stand-in for the part of Ganache used by NonceManager
+# like Ganache it mines transactions of the account in nonce order as soon as they arrive,
+# a transaction whose nonce is above the next one waits in the queue until the nonces below it are used
+class GanacheStandIn:
+
+    def __init__(self, failure_rate=0.0, seed=0):
+        self.eth = self
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.mined = 0
+        self.queued = set()
+        self.nonce_errors = 0
+
+    def get_transaction_count(self, address, block_identifier="latest"):
+        with self.lock:
+            return self.mined
+
+    def send(self, nonce):
+        with self.lock:
+            if self.random.random() < self.failure_rate:
+                raise RuntimeError("connection reset")
+            if nonce < self.mined or nonce in self.queued:
+                self.nonce_errors += 1
+                raise RuntimeError(f"the tx doesn't have the correct nonce, account has nonce of: {self.mined}")
+
+            self.queued.add(nonce)
+            while self.mined in self.queued:
+                self.queued.remove(self.mined)
+                self.mined += 1
+            return nonce
+
+
+@pytest.fixture(params=["memory", "database"])
+def chain_and_manager(request):
+    chain = GanacheStandIn()
+    database_uri = None
+    if request.param == "database":
+        database_uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'nonces.db')}"
+    manager = NonceManager(chain, ADDRESS, database_uri)
+    yield chain, manager
+    if manager.engine is not None:
+        manager.engine.dispose()
+
+
+def test_concurrent_submissions_leave_no_duplicates_or_gaps(chain_and_manager):
+    chain, manager = chain_and_manager
+    chain.failure_rate = 0.1
+    threads, transactions = 8, 40
+
+    def submit(_):
+        sent = []
+        for _ in range(transactions):
+            try:
+                sent.append(manager.submit(chain.send, fill=chain.send))
+            except RuntimeError:
+                pass
+        return sent
+
+    with ThreadPoolExecutor(threads) as executor:
+        sent = [nonce for nonces in executor.map(submit, range(threads)) for nonce in nonces]
+
+    # the next transaction of the owner takes the nonces still released
+    chain.failure_rate = 0.0
+    manager.fill_gaps(chain.send)
+
+    assert chain.nonce_errors == 0
+    assert len(set(sent)) == len(sent)
+    assert chain.queued == set()
+    assert chain.mined >= len(sent) > 0
+
+
+def test_released_nonce_is_reused_before_new_ones(chain_and_manager):
+    chain, manager = chain_and_manager
+    first = manager.allocate()
+    second = manager.allocate()
+
+    # the first transaction failed while the second one is sent, the second waits behind it
+    chain.send(second)
+    manager.release(first)
+    assert chain.mined == 0
+
+    assert manager.allocate() == first
+    chain.send(first)
+    assert chain.mined == 2
+    assert manager.allocate() == second + 1
+
+
+def test_last_nonce_is_taken_back_by_the_counter(chain_and_manager):
+    chain, manager = chain_and_manager
+    nonce = manager.allocate()
+    manager.release(nonce)
+    assert manager.allocate() == nonce
+    assert manager.allocate() == nonce + 1
+
+
+def test_released_nonce_mined_meanwhile_is_not_reused(chain_and_manager):
+    chain, manager = chain_and_manager
+    first = manager.allocate()
+    second = manager.allocate()
+    manager.release(first)
+
+    # the send only looked like it failed, both transactions were mined
+    chain.send(first)
+    chain.send(second)
+    assert manager.allocate() == second + 1
+
+
+def test_resync_only_moves_forward(chain_and_manager):
+    chain, manager = chain_and_manager
+    for _ in range(3):
+        manager.allocate()
+
+    # the chain has seen none of the allocated nonces yet, they are not handed out again
+    manager.resync()
+    assert manager.allocate() == 3
+
+    # transactions signed elsewhere with the owners key were mined
+    chain.mined = 10
+    manager.resync()
+    assert manager.allocate() == 10
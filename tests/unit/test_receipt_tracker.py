@@ -0,0 +1,74 @@
+# tests for the ReceiptTracker shared by the customer and courier services
+#
+# python -m pytest tests/unit
+
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent / "store system" / "customer"))
+
+from receipt_tracker import ReceiptTracker
+
+TRANSACTION = "0x" + "ab" * 32
+
+
+# stand-in for the part of web3 used by ReceiptTracker
+# the transaction is mined in the only block there is, the first batch request fails like a dropped connection
+class FlakyWeb3:
+
+    def __init__(self, failures=1):
+        self.eth = self
+        self.provider = self
+        self.block_number = 1
+        self.failures = failures
+        self.requests = 0
+
+    def make_batch_request(self, requests):
+        self.requests += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection reset")
+        return [{"result": {"transactionHash": transaction_hash}} for _, (transaction_hash,) in requests]
+
+    def get_transaction_receipt(self, transaction_hash):
+        return {"transactionHash": transaction_hash, "status": 1}
+
+    @contextmanager
+    def batch_requests(self):
+        yield BatchStandIn()
+
+
+class BatchStandIn:
+
+    def __init__(self):
+        self.receipts = []
+
+    def add(self, receipt):
+        self.receipts.append(receipt)
+
+    def execute(self):
+        return self.receipts
+
+
+def test_failed_poll_is_repeated_without_a_new_block():
+    w3 = FlakyWeb3(failures=1)
+    tracker = ReceiptTracker(w3, poll_interval=0.01, timeout=5)
+
+    receipt = tracker.track(TRANSACTION).result(timeout=2)
+
+    assert receipt["transactionHash"] == TRANSACTION
+    assert w3.requests == 2
+    assert w3.block_number == 1
+
+
+def test_invalid_batch_response_is_repeated():
+    w3 = FlakyWeb3(failures=0)
+    responses = iter([{"error": "batch requests are not supported"}])
+    make_batch_request = w3.make_batch_request
+    w3.make_batch_request = lambda requests: next(responses, None) or make_batch_request(requests)
+    tracker = ReceiptTracker(w3, poll_interval=0.01, timeout=5)
+
+    receipt = tracker.track(TRANSACTION).result(timeout=2)
+
+    assert receipt["transactionHash"] == TRANSACTION
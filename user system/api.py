@@ -1,8 +1,12 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, g
+import csv
+import json
 from user_database_service import UserDatabaseService
 from orm import db, User
 import os
-from jwtauth import JWTAuth
+from auth import JWTAuth, require_role
+from password_hasher import PasswordHasher
+from registration_worker import RegistrationWorker
 
 host = os.getenv("DB_HOST", "localhost")
 port = int(os.getenv("DB_PORT", 3306))
@@ -15,7 +19,23 @@ app.config['SQLALCHEMY_DATABASE_URI'] = f'mysql+mysqlconnector://{user}:{passwor
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
-userDatabaseService = UserDatabaseService(db, User)
+# cost parameters of password hashes, stored passwords are rehashed on login when they change
+passwordHasher = PasswordHasher(
+    log_n=int(os.getenv("PASSWORD_SCRYPT_LOG_N", 14)),
+    r=int(os.getenv("PASSWORD_SCRYPT_R", 8)),
+    p=int(os.getenv("PASSWORD_SCRYPT_P", 1)),
+    workers=int(os.getenv("PASSWORD_WORKERS", 0)) or None,
+    max_pending=int(os.getenv("PASSWORD_MAX_PENDING", 0)) or None,
+    bulk_workers=int(os.getenv("PASSWORD_BULK_WORKERS", 1)),
+)
+
+userDatabaseService = UserDatabaseService(db, User, passwordHasher)
+
+# worker that registers uploads of /register_bulk, checking and inserting REGISTER_CHUNK_SIZE lines together
+registrationWorker = RegistrationWorker(
+    app, userDatabaseService,
+    chunk_size=int(os.getenv("REGISTER_CHUNK_SIZE", 1000))
+)
 
 @app.route('/register_customer', methods=['POST'])
 def register_customer():
@@ -33,22 +53,73 @@ def login():
     if status != 200:
         return jsonify({"message": message}), status
 
-    token = JWTAuth.generate_token(data={"email": message.email, "password": message.password, "forename": message.forename, "surname": message.surname, "role": message.role.name})
+    token = JWTAuth.generate_token(data={"email": message.email, "forename": message.forename, "surname": message.surname, "role": message.role.name})
     return jsonify({"accessToken": token}), status
 
 @app.route('/delete', methods=['POST'])
+@require_role()
 def delete():
-    token = request.headers.get('Authorization')
-    if not token:
-        return jsonify({"msg": "Missing Authorization Header"}), 401
-    token = token.replace('Bearer ', '')
+    message, status = userDatabaseService.delete_user({"email": g.claims.email})
+    return jsonify({"message": message}), status
 
-    email = JWTAuth.validate_token(token)
-    if email is None:
-        return jsonify({"msg": "Missing Authorization Header"}), 401
+# function that reads users from a CSV stream, every line has forename, surname, email, password and optionally role
+# yields (line, user, error) with the error of lines that can not be parsed
+def read_csv_users(stream):
+    for index, row in enumerate(csv.reader(stream)):
+        if len(row) not in (4, 5):
+            yield index, None, "Incorrect number of values."
+            continue
 
-    message, status = userDatabaseService.delete_user({"email": email})
-    return jsonify({"message": message}), status
+        user = dict(zip(['forename', 'surname', 'email', 'password'], row))
+        if len(row) == 5 and row[4] != '':
+            user['role'] = row[4]
+        yield index, user, ""
+
+# function that reads users from an NDJSON stream, every line is a JSON object with the fields of /register_customer
+# and optionally role, empty lines are skipped
+def read_ndjson_users(stream):
+    for index, line in enumerate(stream):
+        if not line.strip():
+            continue
+        try:
+            user = json.loads(line)
+        except ValueError:
+            user = None
+        if not isinstance(user, dict) or not all(isinstance(value, str) for value in user.values()):
+            yield index, None, "Invalid JSON."
+            continue
+        yield index, user, ""
+
+# endpoint that registers many users at once, the request body is a CSV (text/csv) or NDJSON (application/x-ndjson) stream
+# optional parameter role sets the role of lines without one, couriers by default
+# users are registered in the background, the endpoint returns the id of the job to follow with /register_bulk/<job>
+@app.route('/register_bulk', methods=['POST'])
+@require_role('owner')
+def register_bulk():
+    role = request.args.get('role', 'courier')
+    if role not in UserDatabaseService.BULK_ROLES:
+        return jsonify({"message": "Invalid role."}), 400
+
+    if request.mimetype == 'text/csv':
+        read_users = read_csv_users
+    elif request.mimetype in ('application/x-ndjson', 'application/ndjson'):
+        read_users = read_ndjson_users
+    else:
+        return jsonify({"message": "Unsupported content type."}), 415
+
+    job = registrationWorker.submit(request.stream, read_users, role)
+    return jsonify({"job": job.id}), 202
+
+# endpoint that returns the status of a bulk registration and the outcome of every line processed so far
+# every line is checked like in /register_customer, registered users have an empty message
+@app.route('/register_bulk/<int:job_id>', methods=['GET'])
+@require_role('owner')
+def register_bulk_status(job_id):
+    job = registrationWorker.get(job_id)
+    if job is None:
+        return jsonify({"message": "Unknown job."}), 404
+
+    return jsonify(job.to_dict()), 200
 
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0" ,port=5000)
\ No newline at end of file
@@ -0,0 +1,136 @@
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+# prefix of stored passwords hashed with scrypt, other stored values are legacy plaintext passwords
+SCHEME = "scrypt"
+
+
+# function that derives the key of the password with given scrypt parameters
+# runs in the worker processes, so it only takes and returns plain values
+def derive_key(password, salt, log_n, r, p, key_length):
+    n = 2 ** log_n
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p, dklen=key_length,
+        maxmem=128 * r * (n + p + 2) + 1024 * 1024,
+    )
+
+
+class HasherBusy(Exception):
+    pass
+
+
+# hasher of user passwords with scrypt, whose cost is set by log_n (memory and time), r (block size) and p (parallelism)
+# hashes are computed by a bounded pool of processes, so logins do not hold the interpreter of the Flask process
+# bulk registrations hash in a separate small pool, so they never queue ahead of logins
+# stored hashes have the form scrypt$log_n$r$p$salt$key, so hashes made with older parameters can still be verified
+class PasswordHasher:
+
+    def __init__(self, log_n=14, r=8, p=1, salt_length=16, key_length=32, workers=None, max_pending=None, queue_timeout=5.0, bulk_workers=1):
+        self.log_n = log_n
+        self.r = r
+        self.p = p
+        self.salt_length = salt_length
+        self.key_length = key_length
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_timeout = queue_timeout
+
+        # requests beyond max_pending wait for a free slot instead of piling up in the pool's queue
+        self.slots = threading.BoundedSemaphore(max_pending or 4 * self.workers)
+        self.pool = None
+        self.pool_lock = threading.Lock()
+
+        self.bulk_workers = bulk_workers
+        self.bulk_pool = None
+
+    # function that returns the pool, created with the first hash so the reloader parent process does not start it
+    def get_pool(self):
+        with self.pool_lock:
+            if self.pool is None:
+                # workers are spawned, so they do not inherit threads and connections of the Flask process
+                self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self.pool
+
+    def get_bulk_pool(self):
+        with self.pool_lock:
+            if self.bulk_pool is None:
+                self.bulk_pool = ProcessPoolExecutor(self.bulk_workers, mp_context=multiprocessing.get_context("spawn"))
+            return self.bulk_pool
+
+    def shutdown(self):
+        with self.pool_lock:
+            for pool in (self.pool, self.bulk_pool):
+                if pool is not None:
+                    pool.shutdown()
+            self.pool = self.bulk_pool = None
+
+    # function that derives the key in the pool and waits for it
+    def derive(self, password, salt, log_n, r, p, key_length):
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            raise HasherBusy("Too many passwords are being hashed.")
+        try:
+            return self.get_pool().submit(derive_key, password, salt, log_n, r, p, key_length).result()
+        finally:
+            self.slots.release()
+
+    # function that returns the stored form of the password, hashed with the current parameters
+    def hash(self, password):
+        salt = os.urandom(self.salt_length)
+        key = self.derive(password, salt, self.log_n, self.r, self.p, self.key_length)
+        return self.format(salt, key)
+
+    # function that hashes many passwords with the bulk pool, which leaves the pool of logins free
+    # at most two passwords per bulk worker are queued at a time
+    def hash_many(self, passwords):
+        pool = self.get_bulk_pool()
+        hashes = []
+        batch_size = 2 * self.bulk_workers
+        for start in range(0, len(passwords), batch_size):
+            batch = passwords[start:start + batch_size]
+            salts = [os.urandom(self.salt_length) for _ in batch]
+            keys = pool.map(
+                derive_key, batch, salts,
+                repeat(self.log_n), repeat(self.r), repeat(self.p), repeat(self.key_length),
+            )
+            hashes.extend(self.format(salt, key) for salt, key in zip(salts, keys))
+        return hashes
+
+    def format(self, salt, key):
+        return "$".join([
+            SCHEME, str(self.log_n), str(self.r), str(self.p),
+            base64.b64encode(salt).decode(), base64.b64encode(key).decode(),
+        ])
+
+    # function that returns parameters of the stored hash, or None when the stored value is a legacy plaintext password
+    @staticmethod
+    def parse(stored):
+        parts = stored.split("$")
+        if len(parts) != 6 or parts[0] != SCHEME:
+            return None
+        try:
+            return int(parts[1]), int(parts[2]), int(parts[3]), base64.b64decode(parts[4]), base64.b64decode(parts[5])
+        except ValueError:
+            return None
+
+    # function that checks the password against its stored form
+    def verify(self, stored, password):
+        parsed = PasswordHasher.parse(stored)
+        if parsed is None:
+            return hmac.compare_digest(stored.encode(), password.encode())
+
+        log_n, r, p, salt, key = parsed
+        return hmac.compare_digest(self.derive(password, salt, log_n, r, p, len(key)), key)
+
+    # function that checks whether the stored password is plaintext or hashed with other parameters than the current ones
+    def needs_rehash(self, stored):
+        parsed = PasswordHasher.parse(stored)
+        if parsed is None:
+            return True
+
+        log_n, r, p, salt, key = parsed
+        return (log_n, r, p, len(salt), len(key)) != (self.log_n, self.r, self.p, self.salt_length, self.key_length)
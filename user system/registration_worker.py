@@ -0,0 +1,100 @@
+import io
+import itertools
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+
+# bulk registration accepted by /register_bulk
+class RegistrationJob:
+
+    def __init__(self, job_id, path, read_users, role):
+        self.id = job_id
+        self.path = path  # upload saved to a temporary file
+        self.read_users = read_users
+        self.role = role
+
+        self.status = "queued"
+        self.message = ""
+        self.results = []  # outcome of every processed line
+
+    def to_dict(self):
+        results = list(self.results)
+        created = sum(1 for result in results if not result["message"])
+        return {
+            "job": self.id,
+            "status": self.status,
+            "message": self.message,
+            "created": created,
+            "rejected": len(results) - created,
+            "results": results,
+        }
+
+
+# background worker that registers uploaded users one job at a time
+# uploads are saved to temporary files, so the request answers as soon as the body is received
+class RegistrationWorker:
+
+    def __init__(self, app, userDatabaseService, chunk_size=1000, max_jobs=100):
+        self.app = app
+        self.userDatabaseService = userDatabaseService
+        self.chunk_size = chunk_size
+        self.max_jobs = max_jobs
+
+        self.queue = queue.Queue()
+        self.jobs = {}  # job id -> job, the oldest finished jobs are dropped beyond max_jobs
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    # function that starts the worker thread once
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name="bulk-registration", daemon=True)
+            self.thread.start()
+
+    # function that saves the uploaded stream and schedules its registration, returns the job
+    def submit(self, stream, read_users, role):
+        self.start()
+        with tempfile.NamedTemporaryFile(prefix="register_bulk_", delete=False) as file:
+            shutil.copyfileobj(stream, file)
+
+        with self.lock:
+            job = RegistrationJob(next(self.ids), file.name, read_users, role)
+            self.jobs[job.id] = job
+            finished = [id for id, old in self.jobs.items() if old.status in ("done", "failed")]
+            for id in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+                del self.jobs[id]
+        self.queue.put(job)
+        return job
+
+    # function that returns the job with the given id, or None when it is unknown
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            job.status = "running"
+            try:
+                self.register(job)
+                job.status = "done"
+            except UnicodeDecodeError:
+                job.status = "failed"
+                job.message = "Invalid encoding."
+            except Exception as e:
+                print(f"Failed to register users of job {job.id}: {e}")
+                job.status = "failed"
+                job.message = "Registration failed."
+            finally:
+                os.remove(job.path)
+
+    def register(self, job):
+        with self.app.app_context(), open(job.path, "rb") as file:
+            stream = io.TextIOWrapper(file, encoding="utf-8", newline="")
+            self.userDatabaseService.insert_users(job.read_users(stream), job.role, self.chunk_size, job.results)
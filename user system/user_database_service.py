@@ -1,44 +1,153 @@
 import re
+from itertools import islice
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from password_hasher import HasherBusy
 
 class UserDatabaseService:
-    def __init__(self, db, User):
+    def __init__(self, db, User, passwordHasher):
         self.db = db
         self.User = User
+        self.passwordHasher = passwordHasher
         self.EMAIL_REGEX = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.(com|rs|org)$")
 
+    # maximum number of values bound in a single IN (...) lookup
+    LOOKUP_CHUNK_SIZE = 1000
+
+    # roles that can be given to users registered in bulk
+    BULK_ROLES = ('customer', 'courier')
+
     def insert_user(self, user, role):
+        message = self.check_fields(user)
+        if message:
+            return message, 400
+
+        # only the hash of the password is stored
+        try:
+            password = self.passwordHasher.hash(user['password'])
+        except HasherBusy:
+            return "Server busy.", 503
+
+        # add user to the database, the unique index on email rejects emails that already exist
+        # so concurrent registrations of the same email can not both pass a lookup made before the insert
+        try:
+            self.db.session.execute(insert(self.User).values(
+                email = user['email'],
+                password = password,
+                role = role,
+                forename = user['forename'],
+                surname = user['surname'],
+            ))
+            self.db.session.commit()
+        except IntegrityError:
+            self.db.session.rollback()
+            return "Email already exists.", 400
+
+        return "", 200
+
+    # function that checks fields of a new user, returns the message of the first error or "" when they are valid
+    def check_fields(self, user):
         # check if any field is missing
         if 'forename' not in user or user['forename'] == '':
-            return "Field forename is missing.", 400
+            return "Field forename is missing."
         if 'surname' not in user or user['surname'] == '':
-            return "Field surname is missing.", 400
+            return "Field surname is missing."
         if 'email' not in user or user['email'] == '':
-            return "Field email is missing.", 400
+            return "Field email is missing."
         if 'password' not in user or user['password'] == '':
-            return "Field password is missing.", 400
+            return "Field password is missing."
 
         # check if email is in right format
         if not self.EMAIL_REGEX.match(user['email']):
-            return "Invalid email.", 400
+            return "Invalid email."
 
         # check if password is right length
         if len(user['password']) < 8:
-            return "Invalid password.", 400
+            return "Invalid password."
 
-        # check if email already exists in the database
-        if self.db.session.query(self.User).filter_by(email=user['email']).count() > 0:
-            return "Email already exists.", 400
+        return ""
 
-        # add user to the database
-        self.db.session.add(self.User(
-            email = user['email'],
-            password = user['password'],
-            role = role,
-            forename = user['forename'],
-            surname = user['surname'],
-        ))
-        self.db.session.commit()
-        return "", 200
+    # function that registers users read from a stream, users is an iterable of (line, user, error) where error
+    # is set for lines that could not be parsed, users without a role field get the given role
+    # lines are consumed in chunks of chunk_size, every chunk is checked with set-based queries and inserted in its own transaction
+    # returns the outcome of every line, with an empty message for registered users
+    # outcomes are appended to results as every chunk is committed, so callers can follow the progress
+    def insert_users(self, users, role, chunk_size=1000, results=None):
+        results = [] if results is None else results
+        seen = set()  # emails of valid earlier lines
+        users = iter(users)
+        while chunk := list(islice(users, chunk_size)):
+            results.extend(self.insert_chunk(chunk, role, seen))
+        return results
+
+    # function that checks and inserts one chunk of users and returns their outcomes
+    def insert_chunk(self, chunk, role, seen):
+        messages = {}
+        valid = []
+        for line, user, error in chunk:
+            if not error:
+                error = self.check_fields(user)
+            if not error and user.get('role', role) not in self.BULK_ROLES:
+                error = "Invalid role."
+            if not error and self.key(user['email']) in seen:
+                error = "Email already exists."
+
+            if error:
+                messages[line] = error
+                continue
+            seen.add(self.key(user['email']))
+            valid.append((line, user))
+
+        existing = self.existing_emails([user['email'] for _, user in valid])
+        for line, user in valid:
+            if self.key(user['email']) in existing:
+                messages[line] = "Email already exists."
+        valid = [(line, user) for line, user in valid if line not in messages]
+
+        passwords = self.passwordHasher.hash_many([user['password'] for _, user in valid])
+
+        rows = [
+            {
+                "email": user['email'],
+                "password": password,
+                "role": user.get('role', role),
+                "forename": user['forename'],
+                "surname": user['surname'],
+            }
+            for (_, user), password in zip(valid, passwords)
+        ]
+        while rows:
+            try:
+                self.db.session.execute(insert(self.User), rows)
+                self.db.session.commit()
+                break
+            except IntegrityError:
+                # users registered by other requests since the lookup, they are dropped and the rest inserted again
+                self.db.session.rollback()
+                existing = self.existing_emails([row["email"] for row in rows])
+                if not existing:
+                    raise
+                for line, user in valid:
+                    if self.key(user['email']) in existing:
+                        messages[line] = "Email already exists."
+                rows = [row for row in rows if self.key(row["email"]) not in existing]
+
+        return [{"line": line, "message": messages.get(line, "")} for line, _, _ in chunk]
+
+    # function that returns the lookup key of an email
+    # emails are compared case-insensitively, the same way the database collation compares them
+    @staticmethod
+    def key(email):
+        return email.lower()
+
+    # function that returns which of the given emails already exist in the database
+    def existing_emails(self, emails):
+        existing = set()
+        for start in range(0, len(emails), self.LOOKUP_CHUNK_SIZE):
+            chunk = emails[start:start + self.LOOKUP_CHUNK_SIZE]
+            rows = self.db.session.query(self.User.email).filter(self.User.email.in_(chunk))
+            existing.update(self.key(email) for email, in rows)
+        return existing
 
     def check_user(self, user):
         # check if any field is missing
@@ -53,9 +162,24 @@ class UserDatabaseService:
 
         # check if user with given email and password exists
         user_record = self.db.session.query(self.User).filter_by(email=user['email']).first()
-        if not user_record or not (user_record.password == user['password']):
+        if not user_record:
             return "Invalid credentials.", 400
 
+        try:
+            if not self.passwordHasher.verify(user_record.password, user['password']):
+                return "Invalid credentials.", 400
+        except HasherBusy:
+            return "Server busy.", 503
+
+        # plaintext passwords and hashes made with older cost parameters are replaced with a current hash
+        # when the hasher is busy the password is left as it is and replaced with a later login
+        if self.passwordHasher.needs_rehash(user_record.password):
+            try:
+                user_record.password = self.passwordHasher.hash(user['password'])
+                self.db.session.commit()
+            except HasherBusy:
+                pass
+
         return user_record, 200
 
     def delete_user(self, user):